@@ -1,11 +1,9 @@
-import matplotlib.pyplot as plot
 import jinja2
+import numpy as np
 import argparse
-
-parser = argparse.ArgumentParser(description="Process -s or -c arguments.")
-parser.add_argument('-s', type=str, help='Value for student id')
-parser.add_argument('-c', type=str, help='Value for course id')
-args = parser.parse_args()
+import os
+from concurrent.futures import ProcessPoolExecutor
+from shared import csv_ingest
 
 error_t = """<!DOCTYPE html>
 <html>
@@ -19,78 +17,191 @@ error_t = """<!DOCTYPE html>
 </html>
 """
 
-if args.c:
-    # print(f"c: {args.c}")
-    highest = -1
-    tot_marks = 0
-    count = 0
-    marks_freq: dict[int, int] = {}
-    course_found = False
+# templates are read from next to this file and compiled once per process; the compiled
+# code is also kept on disk, so later runs (and parallel ones) skip compiling them again
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_CACHE = os.path.join(TEMPLATE_DIR, "__pycache__", "jinja")
+os.makedirs(TEMPLATE_CACHE, exist_ok=True)
+templates = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+                               bytecode_cache=jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE))
+
+
+def read_groups(path, student_ids=None, course_ids=None):
+    """Parse data.csv once (with the block parser in shared/csv_ingest.py) and group it by key.
+
+    Returns (students, courses) where students maps a student id to its rows
+    ([student id, course id, marks] as strings) and courses maps a course id to
+    its marks histogram. With student_ids / course_ids given, only those ids are
+    kept; None keeps every id.
+    """
+    students: dict[int, list[list[str]]] = {}
+    courses: dict[int, dict[int, int]] = {}
+
+    def group(rows):
+        if student_ids is None:
+            picked = rows
+        else:
+            picked = rows[np.isin(rows[:, 0], list(student_ids))]
+        for sid, cid, mark in picked.tolist():
+            students.setdefault(sid, []).append([str(sid), str(cid), str(mark)])
+
+        if course_ids is not None:
+            rows = rows[np.isin(rows[:, 1], list(course_ids))]
+        # one pass builds the marks histogram; count, total and max are derived from it
+        pairs, counts = np.unique(rows[:, 1:], axis=0, return_counts=True)
+        for (cid, mark), n in zip(pairs.tolist(), counts.tolist()):
+            marks_freq = courses.setdefault(cid, {})
+            marks_freq[mark] = marks_freq.get(mark, 0) + n
+
+    with open(path, "rb") as f:
+        csv_ingest.read_rows(f, 0, group)
+    return students, courses
+
+
+def draw_chart(course_id, marks_freq, path):
+    # imported here so the student branch (and --chart data) does not load matplotlib at all
+    import matplotlib.pyplot as plot
+    plot.bar(list(marks_freq.keys()), list(marks_freq.values()))
+    plot.xlabel("Marks")
+    plot.ylabel("Frequency")
+    plot.title("Marks Frequency Distribution for Course id: " + str(course_id))
+    plot.savefig(path)  # png or svg, from the file name
+    plot.close()
+
+
+def course_page(course_id, marks_freq, chart="png"):
+    """Course report as an iterator of HTML chunks; chart "png"/"svg" links the drawn image, "data"
+    embeds the counts for the browser to draw."""
+    count = sum(marks_freq.values())
+    tot_marks = sum(mark * n for mark, n in marks_freq.items())
+    highest = max(marks_freq, default=-1)
+    t = templates.get_template("course_temp.html")
+    chart_data = sorted(marks_freq.items()) if chart == "data" else None
+    return t.generate(avg_marks=tot_marks / count if count > 0 else 0, max_marks=highest, course_id=course_id,
+                      chart_file=f"{course_id}.{chart}", chart_data=chart_data)
+
+
+def student_page(details):
+    """Student report as an iterator of HTML chunks, one table row at a time."""
+    tot_marks = sum(int(d[2]) for d in details)  # marks are in the third column
+    t = templates.get_template("stud_temp.html")
+    return t.generate(details=details, total_marks=tot_marks)
+
+
+def write_page(path, chunks):
+    # rendered chunks go straight to the file, the whole page is never held as one string
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.writelines(chunks)
 
-    with open("data.csv") as f:
-        f.readline()  # Skip header
+
+def read_ids_file(path):
+    """Read '-s <id>' / '-c <id>' lines (leading dash optional, '#' starts a comment)."""
+    student_ids, course_ids = set(), set()
+    with open(path) as f:
         for line in f:
-            line = line.strip().split(",")
-            if int(args.c) == int(line[1]):
-                course_found = True
-                highest = max(highest, int(line[2]))
-                tot_marks += int(line[2])
-                count += 1
-                if line[2] in marks_freq:
-                    marks_freq[int(line[2])] += 1
-                else:
-                    marks_freq[int(line[2])] = 1
-
-    if course_found:
-        plot.bar(list(marks_freq.keys()), list(marks_freq.values()))
-        plot.xlabel("Marks")
-        plot.ylabel("Frequency")
-        plot.title("Marks Frequency Distribution for Course id: " + args.c)
-        plot.savefig(f"./{args.c}.png")
-        plot.close()
-
-        # print(f"Highest marks: {highest}")
-        # print(f"Average marks: {tot_marks / count if count > 0 else 0}")
-
-        t = jinja2.Template(open("./course_temp.html").read())
-        details = t.render(avg_marks=tot_marks / count if count > 0 else 0, max_marks=highest, course_id=args.c)
+            line = line.split("#", 1)[0].split()
+            if not line:
+                continue
+            kind, value = line[0].lstrip("-"), int(line[1])
+            if kind == "s":
+                student_ids.add(value)
+            elif kind == "c":
+                course_ids.add(value)
+            else:
+                raise ValueError(f"Unknown id kind {line[0]!r} in {path}")
+    return student_ids, course_ids
+
+
+def run_batch(args):
+    """Render one report per id, parsing data.csv a single time."""
+    if args.ids_file:
+        student_ids, course_ids = read_ids_file(args.ids_file)
     else:
-        details = error_t
+        student_ids, course_ids = set(), set()
+    # None means "every id found in the file"
+    if args.all_students:
+        student_ids = None
+    if args.all_courses:
+        course_ids = None
 
-    with open("output.html", "w") as f:
-        f.write(details)
+    students, courses = read_groups("data.csv", student_ids, course_ids)
+    os.makedirs(args.out_dir, exist_ok=True)
 
-    # print(details)
+    for sid in (students if student_ids is None else sorted(student_ids)):
+        details = students.get(sid)
+        write_page(os.path.join(args.out_dir, f"student_{sid}.html"), student_page(details) if details else [error_t])
 
-elif args.s:
-    # print(f"s: {args.s}")
+    wanted = list(courses) if course_ids is None else sorted(course_ids)
+    found = [cid for cid in wanted if cid in courses]
+    for cid in wanted:
+        write_page(os.path.join(args.out_dir, f"course_{cid}.html"),
+                   course_page(cid, courses[cid], args.chart) if cid in courses else [error_t])
+
+    if args.chart == "data":
+        return
+    # charts are the slow part, optionally spread over worker processes
+    chart_args = (found,
+                  [courses[cid] for cid in found],
+                  [os.path.join(args.out_dir, f"{cid}.{args.chart}") for cid in found])
+    if args.workers > 1 and len(found) > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(draw_chart, *chart_args, chunksize=max(1, len(found) // (args.workers * 4))))
+    else:
+        for cid, marks_freq, path in zip(*chart_args):
+            draw_chart(cid, marks_freq, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process -s or -c arguments.")
+    parser.add_argument('-s', type=str, help='Value for student id')
+    parser.add_argument('-c', type=str, help='Value for course id')
+    parser.add_argument('--all-students', action='store_true', help='Write a report for every student')
+    parser.add_argument('--all-courses', action='store_true', help='Write a report for every course')
+    parser.add_argument('--ids-file', type=str, help='File with one "-s <id>" or "-c <id>" per line')
+    parser.add_argument('-o', '--output', type=str, default='output.html',
+                        help='Report file for -s / -c (the course chart is written next to it)')
+    parser.add_argument('--out-dir', type=str, default='reports', help='Folder for batch reports')
+    parser.add_argument('--workers', type=int, default=1, help='Processes used to draw charts in batch mode')
+    parser.add_argument('--chart', choices=('png', 'svg', 'data'), default='png',
+                        help='Chart as a PNG or SVG file, or "data" to draw it in the browser from embedded counts')
+    args = parser.parse_args()
+
+    if args.all_students or args.all_courses or args.ids_file:
+        run_batch(args)
+
+    elif args.c:
+        out_dir = os.path.dirname(args.output) or "."
+        os.makedirs(out_dir, exist_ok=True)
+        course_id = int(args.c)
+        _, courses = read_groups("data.csv", student_ids=set(), course_ids={course_id})
+        marks_freq = courses.get(course_id)
+
+        if marks_freq:
+            if args.chart != "data":
+                draw_chart(args.c, marks_freq, os.path.join(out_dir, f"{args.c}.{args.chart}"))
+            details = course_page(args.c, marks_freq, args.chart)
+        else:
+            details = [error_t]
+
+        write_page(args.output, details)
+
+    elif args.s:
+        student_id = int(args.s)
+        students, _ = read_groups("data.csv", student_ids={student_id}, course_ids=set())
+        details = students.get(student_id)
+
+        if details:
+            details = student_page(details)
+        else:
+            details = [error_t]
+
+        write_page(args.output, details)
 
-    details = []
-    stud_found = False
-    tot_marks = 0
-    with open("data.csv") as f:
-        f.readline()  # Skip header
-        for line in f:
-            line = line.strip().split(",")
-            if int(args.s) == int(line[0]):
-                stud_found = True
-                line[0] = line[0].strip()  # Clean spaces from student id
-                line[1] = line[1].strip()  # Clean spaces from name
-                line[2] = line[2].strip()  # Clean spaces from course id
-                details.append(line)
-                tot_marks += int(line[2])  # Assuming marks are in the third column
-
-    if stud_found:
-        t = jinja2.Template(open("./stud_temp.html").read())
-        details = t.render(details=details, total_marks=tot_marks)
     else:
-        details = error_t
+        # print("No arguments provided.")
+        write_page(args.output, [error_t])
 
-    with open("output.html", "w") as f:
-        f.write(details)
 
-    # print(details)
-else:
-    # print("No arguments provided.")
-    with open("output.html", "w") as f:
-        f.write(error_t)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,48 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for
-import csv
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, abort, jsonify
+from shared import metrics
+import chart_render
+from marks_store import MarksStore
+from chart_cache import ChartCache, chart_key
+from chart_jobs import ChartJobs
 
 
 BASE_DIR = os.path.dirname(__file__)
-DATA_FILE = os.path.join(BASE_DIR, "data.csv")
+# WEEK4_DATA_FILE / WEEK4_CHARTS_DIR point the app at other data, e.g. the benchmark's
+DATA_FILE = os.environ.get("WEEK4_DATA_FILE", os.path.join(BASE_DIR, "data.csv"))
 IMAGES_DIR = os.path.join(BASE_DIR, "static", "images")
+CHARTS_DIR = os.environ.get("WEEK4_CHARTS_DIR", os.path.join(BASE_DIR, "chart_cache"))
+# upper bound for the rendered charts kept on disk, per image format
+CHARTS_MAX_BYTES = 64 * 1024 * 1024
+# processes drawing charts in the background (0 draws them inline) and how many may be queued
+CHART_WORKERS = int(os.environ.get("WEEK4_CHART_WORKERS", 2))
+CHART_QUEUE_DEPTH = int(os.environ.get("WEEK4_CHART_QUEUE_DEPTH", 32))
+# png / svg images drawn on the server, or "data" for a chart drawn in the browser; ?chart= overrides it
+CHART_MODE = os.environ.get("WEEK4_CHART_MODE", "png")
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
+app.config["METRICS"] = os.environ.get("WEEK4_METRICS") == "1"
+# ?profile=1 writes files, so outside debug mode it needs WEEK4_METRICS_PROFILE=1 too
+app.config["METRICS_PROFILE"] = os.environ.get("WEEK4_METRICS_PROFILE") == "1"
+metrics.init_app(app, "week4")
+
+# loaded once and reloaded only when data.csv changes on disk
+store = MarksStore(DATA_FILE)
+charts = {fmt: ChartCache(CHARTS_DIR, CHARTS_MAX_BYTES, suffix="." + fmt) for fmt in chart_render.FORMATS}
+chart_jobs = ChartJobs(charts, CHART_WORKERS, CHART_QUEUE_DEPTH)
+
+
+def snapshot():
+	# checks data.csv for changes and (re)parses it when needed
+	with metrics.timer("data_load"):
+		return store.snapshot()
 
 
 def read_data():
-	"""Read data.csv and return list of rows as tuples (student_id, course_id, marks)."""
-	rows = []
-	if not os.path.exists(DATA_FILE):
-		return rows
-	with open(DATA_FILE, newline="") as f:
-		reader = csv.reader(f)
-		headers = next(reader, None)
-		for r in reader:
-			if not r:
-				continue
-			# strip spaces
-			r = [c.strip() for c in r]
-			try:
-				sid = int(r[0])
-				cid = int(r[1])
-				marks = int(r[2])
-			except Exception:
-				# skip malformed lines
-				continue
-			rows.append((sid, cid, marks))
-	return rows
+	"""Return the rows of data.csv as tuples (student_id, course_id, marks)."""
+	snap = snapshot()
+	return list(zip(snap.student_ids.tolist(), snap.course_ids.tolist(), snap.marks.tolist()))
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -65,18 +72,11 @@ def student():
 	except ValueError:
 		return render_template("student.html", error="Invalid student id", details=None)
 
-	rows = read_data()
-	details = [("Course id", "Marks")]
-	total = 0
-	found = False
-	student_rows = []
-	for r in rows:
-		if r[0] == sid_i:
-			found = True
-			student_rows.append({"course": r[1], "marks": r[2]})
-			total += r[2]
-
-	if not found:
+	rows = snapshot().student_rows(sid_i)
+	student_rows = [{"course": c, "marks": m} for c, m in rows]
+	total = sum(m for _, m in rows)
+
+	if not rows:
 		return render_template("student.html", error=f"Student id {sid_i} not found", details=None)
 
 	return render_template("student.html", error=None, details=student_rows, total=total, student_id=sid_i)
@@ -92,39 +92,53 @@ def course():
 	except ValueError:
 		return render_template("course.html", error="Invalid course id", avg=None, maxm=None, img_path=None)
 
-	rows = read_data()
-	marks = []
-	for r in rows:
-		if r[1] == cid_i:
-			marks.append(r[2])
+	# precomputed count/sum/max/histogram, no scan over raw rows
+	stats = snapshot().course_summary(cid_i)
 
-	if not marks:
+	if stats is None:
 		return render_template("course.html", error=f"Course id {cid_i} not found", avg=None, maxm=None, img_path=None)
 
-	avg = sum(marks) / len(marks)
-	maxm = max(marks)
-
-	# frequency
-	freq = {}
-	for m in marks:
-		freq[m] = freq.get(m, 0) + 1
-
-	# create bar chart
-	img_name = f"course_{cid_i}.png"
-	img_path = os.path.join(IMAGES_DIR, img_name)
-	plt.figure(figsize=(8, 4))
-	plt.bar(list(freq.keys()), list(freq.values()), color="#4b7bec")
-	plt.xlabel("Marks")
-	plt.ylabel("Frequency")
-	plt.title(f"Marks Frequency Distribution for Course id: {cid_i}")
-	plt.tight_layout()
-	plt.savefig(img_path)
-	plt.close()
-
-	# Use static path for template
-	static_img_path = url_for('static', filename=f"images/{img_name}")
-
-	return render_template("course.html", error=None, avg=avg, maxm=maxm, img_path=static_img_path, course_id=cid_i)
+	avg = stats.avg
+	maxm = stats.max
+	freq = stats.hist
+
+	mode = request.args.get("chart", CHART_MODE)
+	if mode not in chart_render.MODES:
+		mode = CHART_MODE
+	if mode == "data":
+		# the browser draws the bars from the counts, nothing is plotted here
+		return render_template("course.html", error=None, avg=avg, maxm=maxm, img_path=None, course_id=cid_i,
+			chart_data=sorted(freq.items()))
+
+	# bar chart, only drawn when this course's histogram has not been rendered before;
+	# a new chart is drawn in the background and the page polls for it
+	key = chart_key(cid_i, freq)
+	state = chart_jobs.submit(key, cid_i, freq, mode)
+	img_path = url_for('chart_image', key=key, fmt=mode) if state == "ready" else None
+	status_url = url_for('chart_status', key=key, fmt=mode) if state == "pending" else None
+
+	return render_template("course.html", error=None, avg=avg, maxm=maxm, img_path=img_path, course_id=cid_i,
+		chart_state=state, chart_status_url=status_url)
+
+
+@app.route("/charts/<key>.<any(png, svg):fmt>/status")
+def chart_status(key, fmt):
+	state = chart_jobs.status(key, fmt)
+	body = {"status": state}
+	if state == "ready":
+		body["url"] = url_for('chart_image', key=key, fmt=fmt)
+	return jsonify(body), (404 if state == "unknown" else 200)
+
+
+@app.route("/charts/<key>.<any(png, svg):fmt>")
+def chart_image(key, fmt):
+	# the file name is a hash of the chart contents, so it never changes once written
+	if not charts[fmt].exists(key):
+		abort(404)
+	resp = send_from_directory(CHARTS_DIR, charts[fmt].filename(key), etag=key, max_age=365 * 24 * 3600)
+	resp.cache_control.public = True
+	resp.cache_control.immutable = True
+	return resp
 
 
 if __name__ == "__main__":
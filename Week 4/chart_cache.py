@@ -0,0 +1,110 @@
+"""Content-addressed on-disk cache for the course histogram charts.
+
+A chart is stored as ``<key>.png`` where the key is a hash of everything that
+goes into the picture (course id and marks histogram), so an unchanged course is
+served straight from disk and only courses whose data changed get re-rendered.
+Files are evicted least-recently-used first once the directory grows beyond
+``max_bytes``.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# bump when the chart layout changes so old images are not reused
+CHART_VERSION = 1
+
+
+def chart_key(course_id, hist):
+	"""Stable hash of the inputs of a course chart."""
+	payload = json.dumps([CHART_VERSION, course_id, sorted(hist.items())], separators=(",", ":"))
+	return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class ChartCache:
+	def __init__(self, directory, max_bytes, suffix=".png"):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.suffix = suffix
+		# stops two requests for the same chart from drawing it twice in get()
+		self._render_lock = threading.Lock()
+		self._lock = threading.Lock()
+		self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+		self._total = 0
+		os.makedirs(directory, exist_ok=True)
+		self._scan()
+
+	def _scan(self):
+		"""Pick up files left by a previous run, oldest modification first."""
+		found = []
+		for name in os.listdir(self.directory):
+			if not name.endswith(self.suffix):
+				continue
+			st = os.stat(os.path.join(self.directory, name))
+			found.append((st.st_mtime, name[:-len(self.suffix)], st.st_size))
+		for _, key, size in sorted(found):
+			self._entries[key] = size
+			self._total += size
+		self._evict()
+
+	def filename(self, key):
+		return key + self.suffix
+
+	def path(self, key):
+		return os.path.join(self.directory, self.filename(key))
+
+	def _touch(self, key):
+		with self._lock:
+			if key not in self._entries:
+				return False
+			self._entries.move_to_end(key)
+		try:
+			# keep recency across restarts, _scan orders by mtime
+			os.utime(self.path(key))
+		except FileNotFoundError:
+			with self._lock:
+				self._total -= self._entries.pop(key, 0)
+			return False
+		return True
+
+	def _evict(self):
+		with self._lock:
+			while self._total > self.max_bytes and len(self._entries) > 1:
+				key, size = self._entries.popitem(last=False)
+				self._total -= size
+				try:
+					os.remove(self.path(key))
+				except FileNotFoundError:
+					pass
+
+	def exists(self, key):
+		"""True when key is cached; also marks it as recently used."""
+		return self._touch(key)
+
+	def tmp_path(self, key):
+		"""Where to draw the chart for key before add() moves it into place."""
+		return f"{self.path(key)}.{os.getpid()}.tmp"
+
+	def add(self, key, tmp):
+		"""Move a finished chart from tmp into the cache under key."""
+		path = self.path(key)
+		os.replace(tmp, path)
+		with self._lock:
+			size = os.path.getsize(path)
+			self._total += size - self._entries.get(key, 0)
+			self._entries[key] = size
+			self._entries.move_to_end(key)
+		self._evict()
+
+	def get(self, key, render):
+		"""Return the cached file name for key, calling render(path) only on a miss."""
+		if self._touch(key):
+			return self.filename(key)
+		with self._render_lock:
+			if self._touch(key):
+				return self.filename(key)
+			tmp = self.tmp_path(key)
+			render(tmp)
+			self.add(key, tmp)
+		return self.filename(key)
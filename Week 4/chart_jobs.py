@@ -0,0 +1,125 @@
+"""Course charts drawn in a background process pool instead of on the request thread.
+
+``submit`` returns at once with the chart's state:
+
+- ``ready``: the chart is in the chart cache;
+- ``pending``: a worker is drawing it (a second request for the same chart joins
+  the job already running instead of starting another one);
+- ``busy``: ``max_pending`` charts are already queued, nothing was started;
+- ``failed``: the last attempt raised; the next submit tries again.
+
+``caches`` holds one ChartCache per image format (``{"png": ..., "svg": ...}``);
+all formats share the one pool. Finished charts are moved into their cache by a
+callback in this process. With ``workers=0`` charts are drawn inline, as before
+the pool existed.
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import chart_render
+from shared import metrics
+
+# failed jobs remembered for status(); the oldest are forgotten beyond this
+MAX_FAILED = 1024
+
+
+class ChartJobs:
+	def __init__(self, caches, workers=2, max_pending=32):
+		self.caches = caches
+		self.workers = workers
+		self.max_pending = max_pending
+		self._lock = threading.Lock()
+		self._pool = None  # started on the first chart that has to be drawn
+		self._pending = {}  # (fmt, key) -> Event, set once the job's result has been handled
+		self._failed = {}  # (fmt, key) -> error message of the last attempt, oldest first
+
+	def _executor(self):
+		if self._pool is None:
+			# spawn: forking a process that runs request threads can copy held locks
+			self._pool = ProcessPoolExecutor(
+				max_workers=self.workers,
+				mp_context=multiprocessing.get_context("spawn"),
+				initializer=chart_render.warm_up,
+			)
+		return self._pool
+
+	def status(self, key, fmt="png"):
+		# pending first and under the lock: _finished adds the chart to the cache before it drops
+		# the job from _pending, so a job finishing meanwhile is seen in one of the two
+		with self._lock:
+			if (fmt, key) in self._pending:
+				return "pending"
+			if self.caches[fmt].exists(key):
+				return "ready"
+			if (fmt, key) in self._failed:
+				return "failed"
+		return "unknown"
+
+	def submit(self, key, cid, freq, fmt="png"):
+		"""Start drawing the chart for key unless it is cached or already being drawn; returns its state."""
+		cache = self.caches[fmt]
+		if cache.exists(key):
+			return "ready"
+		if self.workers <= 0:
+			cache.get(key, lambda path: self._draw_inline(cid, freq, path, fmt))
+			return "ready"
+		job = (fmt, key)
+		with self._lock:
+			if job in self._pending:
+				return "pending"
+			if len(self._pending) >= self.max_pending:
+				return "busy"
+			self._failed.pop(job, None)
+			tmp = cache.tmp_path(key)
+			pool = self._executor()
+			future = pool.submit(chart_render.render_job, cid, dict(freq), tmp, fmt)
+			self._pending[job] = done = threading.Event()
+		future.add_done_callback(lambda f: self._finished(job, tmp, f, done, pool))
+		return "pending"
+
+	@staticmethod
+	def _draw_inline(cid, freq, path, fmt):
+		with metrics.timer("chart_render", format=fmt):
+			chart_render.course_chart(cid, freq, path, fmt)
+
+	def _finished(self, job, tmp, future, done, pool):
+		fmt, key = job
+		error = future.exception()
+		if error is None:
+			try:
+				self.caches[fmt].add(key, tmp)
+				metrics.observe("chart_render", future.result(), format=fmt)
+			except OSError as e:
+				error = e
+		if error is not None and os.path.exists(tmp):
+			os.remove(tmp)
+		with self._lock:
+			self._pending.pop(job, None)
+			# re-inserted on failure, so the dict stays ordered oldest first
+			self._failed.pop(job, None)
+			if error is not None:
+				self._failed[job] = repr(error)
+				while len(self._failed) > MAX_FAILED:
+					del self._failed[next(iter(self._failed))]
+			# a worker died (e.g. killed for memory); the next chart starts a new pool. Jobs of
+			# an older pool can report this late and must not shut down the one now in use
+			if isinstance(error, BrokenProcessPool) and self._pool is pool:
+				self._pool.shutdown(wait=False)
+				self._pool = None
+		done.set()
+
+	def wait(self, key, fmt="png", timeout=None):
+		"""Block until the job for key (if any) is done; for scripts and tests."""
+		with self._lock:
+			done = self._pending.get((fmt, key))
+		if done is not None:
+			done.wait(timeout)
+		return self.status(key, fmt)
+
+	def shutdown(self):
+		if self._pool is not None:
+			self._pool.shutdown(wait=True)
+			self._pool = None
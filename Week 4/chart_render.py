@@ -0,0 +1,40 @@
+"""Drawing of the course charts.
+
+Charts are drawn with matplotlib's object-oriented ``Figure`` API, which keeps no
+global state, so several can be drawn at once (threads or chart_jobs' worker
+processes). matplotlib is imported on the first chart drawn, not when the app
+starts: it costs several hundred milliseconds, and the student page or a course
+whose chart is already in the chart cache never needs it.
+"""
+import time
+
+# chart modes: "png" and "svg" are drawn here, "data" sends the histogram to the
+# page and lets the browser draw it (static/bar_chart.js)
+FORMATS = ("png", "svg")
+MODES = FORMATS + ("data",)
+
+
+def warm_up():
+	"""Import matplotlib ahead of the first chart (used as the worker process initializer)."""
+	import matplotlib.figure  # noqa: F401
+
+
+def course_chart(cid, freq, path, fmt="png"):
+	"""Bar chart of a course's marks histogram (marks -> count), written to path as fmt."""
+	from matplotlib.figure import Figure
+
+	fig = Figure(figsize=(8, 4))
+	ax = fig.subplots()
+	ax.bar(list(freq.keys()), list(freq.values()), color="#4b7bec")
+	ax.set_xlabel("Marks")
+	ax.set_ylabel("Frequency")
+	ax.set_title(f"Marks Frequency Distribution for Course id: {cid}")
+	fig.tight_layout()
+	fig.savefig(path, format=fmt)
+
+
+def render_job(cid, freq, path, fmt="png"):
+	"""course_chart() as run in a worker process; returns the seconds it took."""
+	started = time.perf_counter()
+	course_chart(cid, freq, path, fmt)
+	return time.perf_counter() - started
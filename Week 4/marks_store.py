@@ -0,0 +1,230 @@
+"""Loaded-once, column oriented view of data.csv for the Week 4 app.
+
+The rows are held as three int32 numpy columns (student id, course id, marks)
+together with hash indexes mapping every student / course id to the row
+positions that hold it, so a lookup only touches the rows for that key instead
+of re-parsing the whole file. Per-course aggregates (count, sum, min, max and a
+marks histogram) are computed once at load so course pages never look at raw
+rows.
+
+The store checks the file's mtime and size on every access. When data.csv has
+only grown (rows appended), just the new bytes after the last parsed offset are
+read and folded into the columns, indexes and aggregates; any other change
+triggers a full reload. Parsing and the memory-mapped ``data.csv.bin`` sidecar
+that lets a restart skip the text parse live in shared/csv_ingest.py.
+"""
+import os
+import threading
+
+import numpy as np
+
+from shared import csv_ingest
+
+
+def _build_index(column, base=0):
+	"""Return {key: row positions} for an int column, grouping with one argsort."""
+	if not len(column):
+		return {}
+	order = np.argsort(column, kind="stable")
+	keys, starts = np.unique(column[order], return_index=True)
+	ends = np.append(starts[1:], len(order))
+	if base:
+		order += base
+	# every entry is a view into the one sorted position array
+	return {k: order[s:e] for k, s, e in zip(keys.tolist(), starts.tolist(), ends.tolist())}
+
+
+class CourseStats:
+	"""Running count, sum, min, max and marks histogram for one course."""
+
+	__slots__ = ("count", "total", "min", "max", "hist")
+
+	def __init__(self):
+		self.count = 0
+		self.total = 0
+		self.min = None
+		self.max = None
+		self.hist = {}
+
+	def add(self, mark, n=1):
+		self.count += n
+		self.total += mark * n
+		self.min = mark if self.min is None else min(self.min, mark)
+		self.max = mark if self.max is None else max(self.max, mark)
+		self.hist[mark] = self.hist.get(mark, 0) + n
+
+	def merge(self, other):
+		for mark, n in other.hist.items():
+			self.add(mark, n)
+
+	def copy(self):
+		c = CourseStats()
+		c.count, c.total, c.min, c.max = self.count, self.total, self.min, self.max
+		c.hist = dict(self.hist)
+		return c
+
+	@property
+	def avg(self):
+		return self.total / self.count if self.count else 0
+
+
+def _course_stats(course_ids, marks):
+	"""Build {course_id: CourseStats} in one vectorized pass over the columns."""
+	stats = {}
+	if not len(marks):
+		return stats
+	# pack (course, mark) into one int64 so a flat unique does the grouping
+	low = int(marks.min())
+	keys = (course_ids.astype(np.int64) << 32) | (marks.astype(np.int64) - low)
+	keys, counts = np.unique(keys, return_counts=True)
+	pairs = zip((keys >> 32).tolist(), ((keys & 0xFFFFFFFF) + low).tolist())
+	for (cid, mark), n in zip(pairs, counts.tolist()):
+		s = stats.get(cid)
+		if s is None:
+			s = stats[cid] = CourseStats()
+		s.add(mark, n)
+	return stats
+
+
+class MarksSnapshot:
+	"""Immutable set of columns, indexes and aggregates; a request uses one snapshot throughout."""
+
+	def __init__(self, student_ids, course_ids, marks, by_student=None, by_course=None, course_stats=None):
+		self.student_ids = student_ids
+		self.course_ids = course_ids
+		self.marks = marks
+		self.by_student = _build_index(student_ids) if by_student is None else by_student
+		self.by_course = _build_index(course_ids) if by_course is None else by_course
+		self.course_stats = _course_stats(course_ids, marks) if course_stats is None else course_stats
+
+	def __len__(self):
+		return len(self.marks)
+
+	def extend(self, student_ids, course_ids, marks):
+		"""Return a new snapshot with the appended rows; only touched keys are rebuilt."""
+		if not len(marks):
+			return self
+		base = len(self)
+
+		def merge_index(index, column):
+			merged = dict(index)
+			for k, pos in _build_index(column, base).items():
+				old = merged.get(k)
+				merged[k] = pos if old is None else np.concatenate((old, pos))
+			return merged
+
+		stats = dict(self.course_stats)
+		for cid, s in _course_stats(course_ids, marks).items():
+			old = stats.get(cid)
+			if old is not None:
+				old = old.copy()
+				old.merge(s)
+				s = old
+			stats[cid] = s
+
+		return MarksSnapshot(
+			np.concatenate((self.student_ids, student_ids)),
+			np.concatenate((self.course_ids, course_ids)),
+			np.concatenate((self.marks, marks)),
+			by_student=merge_index(self.by_student, student_ids),
+			by_course=merge_index(self.by_course, course_ids),
+			course_stats=stats,
+		)
+
+	def student_rows(self, sid):
+		"""List of (course_id, marks) for a student, in file order."""
+		idx = self.by_student.get(sid)
+		if idx is None:
+			return []
+		return list(zip(self.course_ids[idx].tolist(), self.marks[idx].tolist()))
+
+	def course_marks(self, cid):
+		"""numpy array with every mark recorded for a course, in file order."""
+		idx = self.by_course.get(cid)
+		if idx is None:
+			return self.marks[:0]
+		return self.marks[idx]
+
+	def course_summary(self, cid):
+		"""CourseStats for a course (O(1)), or None when the course has no rows."""
+		return self.course_stats.get(cid)
+
+
+def _snapshot_of(rows):
+	# columns are strided views, so a mapped sidecar is never copied into memory here
+	return MarksSnapshot(rows[:, 0], rows[:, 1], rows[:, 2])
+
+
+class MarksStore:
+	"""Keeps the latest MarksSnapshot of a CSV file, following appends by byte offset."""
+
+	def __init__(self, path, sidecar_path=None):
+		self.path = path
+		self.sidecar_path = sidecar_path or path + ".bin"
+		self._lock = threading.Lock()
+		self._stamp = None
+		self._loaded = False
+		self._offset = 0  # bytes of the file already folded into the snapshot
+		self._fingerprint = b""
+		self._clean_end = True  # False when the last parsed line had no newline
+		self._snapshot = _snapshot_of(csv_ingest.empty_rows())
+
+	def _file_stamp(self):
+		try:
+			st = os.stat(self.path)
+		except FileNotFoundError:
+			return None
+		return (st.st_mtime_ns, st.st_size)
+
+	def _use_sidecar(self, sidecar):
+		self._snapshot = _snapshot_of(sidecar.rows)
+		self._offset = sidecar.offset
+		self._clean_end = sidecar.clean_end
+		self._fingerprint = sidecar.fingerprint
+		self._loaded = True
+
+	def _is_append(self, f, size):
+		return self._loaded and csv_ingest.matches(f, size, self._offset, self._clean_end, self._fingerprint)
+
+	def _read_tail(self, f):
+		blocks = []
+		self._offset, self._clean_end = csv_ingest.read_rows(f, self._offset, blocks.append)
+		self._fingerprint = csv_ingest.fingerprint(f, self._offset)
+		rows = np.concatenate(blocks) if blocks else csv_ingest.empty_rows()
+		self._snapshot = self._snapshot.extend(rows[:, 0], rows[:, 1], rows[:, 2])
+		return len(rows)
+
+	def _refresh(self, stamp):
+		if stamp is None:
+			self._loaded = False
+			self._offset, self._fingerprint, self._clean_end = 0, b"", True
+			self._snapshot = _snapshot_of(csv_ingest.empty_rows())
+			return
+		with open(self.path, "rb") as f:
+			if not self._loaded:
+				# first load: start from the sidecar left by an earlier run when it still fits
+				sidecar = csv_ingest.open_sidecar(self.sidecar_path)
+				if sidecar is not None and csv_ingest.matches(f, stamp[1], sidecar.offset, sidecar.clean_end, sidecar.fingerprint):
+					tail = []
+					offset, clean_end = csv_ingest.read_rows(f, sidecar.offset, tail.append)
+					if sum(len(rows) for rows in tail):
+						# fold the rows appended since into the sidecar for the next start
+						sidecar = csv_ingest.save_sidecar(self.sidecar_path, [sidecar.rows] + tail, offset, clean_end, csv_ingest.fingerprint(f, offset))
+					self._use_sidecar(sidecar)
+					return
+			elif self._is_append(f, stamp[1]):
+				self._read_tail(f)
+				return
+		self._use_sidecar(csv_ingest.build_sidecar(self.path, self.sidecar_path))
+
+	def snapshot(self):
+		"""Return the current snapshot, catching up with data.csv first if it changed on disk."""
+		stamp = self._file_stamp()
+		if stamp != self._stamp:
+			with self._lock:
+				# another thread may have refreshed while we waited for the lock
+				stamp = self._file_stamp()
+				if stamp != self._stamp:
+					self._refresh(stamp)
+					self._stamp = stamp
+		return self._snapshot
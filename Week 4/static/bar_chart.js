@@ -0,0 +1,45 @@
+// Bar chart of a course's marks histogram drawn in the browser ("data" chart mode),
+// so the server sends the counts instead of an image.
+function barChart(box, data, title) {
+  var NS = "http://www.w3.org/2000/svg";
+  var width = 800, height = 400, left = 60, right = 20, top = 40, bottom = 50;
+  var svg = document.createElementNS(NS, "svg");
+  svg.setAttribute("width", width);
+  svg.setAttribute("height", height);
+  svg.setAttribute("role", "img");
+  svg.setAttribute("aria-label", title);
+
+  function add(tag, attrs, text) {
+    var el = document.createElementNS(NS, tag);
+    for (var name in attrs) el.setAttribute(name, attrs[name]);
+    if (text !== undefined) el.textContent = text;
+    svg.appendChild(el);
+    return el;
+  }
+
+  var marks = data.map(function (d) { return d[0]; });
+  var lo = Math.min.apply(null, marks), hi = Math.max.apply(null, marks);
+  var top_count = Math.max.apply(null, data.map(function (d) { return d[1]; }));
+  var plotW = width - left - right, plotH = height - top - bottom;
+  var slot = plotW / (hi - lo + 1);
+  function x(mark) { return left + (mark - lo) * slot; }
+  function y(count) { return top + plotH - count / top_count * plotH; }
+
+  data.forEach(function (d) {
+    add("rect", {x: x(d[0]) + slot * 0.1, y: y(d[1]), width: slot * 0.8, height: plotH - (y(d[1]) - top), fill: "#4b7bec"})
+      .appendChild(document.createElementNS(NS, "title")).textContent = d[0] + ": " + d[1];
+  });
+
+  add("line", {x1: left, y1: top + plotH, x2: left + plotW, y2: top + plotH, stroke: "black"});
+  add("line", {x1: left, y1: top, x2: left, y2: top + plotH, stroke: "black"});
+  [lo, hi].forEach(function (mark) {
+    add("text", {x: x(mark) + slot / 2, y: top + plotH + 16, "text-anchor": "middle", "font-size": 12}, mark);
+  });
+  [0, top_count].forEach(function (count) {
+    add("text", {x: left - 6, y: y(count) + 4, "text-anchor": "end", "font-size": 12}, count);
+  });
+  add("text", {x: left + plotW / 2, y: height - 12, "text-anchor": "middle"}, "Marks");
+  add("text", {x: 16, y: top + plotH / 2, "text-anchor": "middle", transform: "rotate(-90 16 " + (top + plotH / 2) + ")"}, "Frequency");
+  add("text", {x: width / 2, y: 24, "text-anchor": "middle", "font-size": 16}, title);
+  box.appendChild(svg);
+}
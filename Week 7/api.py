@@ -0,0 +1,98 @@
+"""Helpers for the /api/v1 JSON endpoints.
+
+Collections are streamed: the SELECT is executed with ``yield_per`` so rows come
+off the cursor in chunks, and each chunk is encoded and sent before the next one
+is fetched, so memory use does not grow with the table. The body is a JSON
+array, or one object per line (NDJSON) with ``?format=ndjson`` /
+``Accept: application/x-ndjson``.
+
+ETags come from the per-table change counters in the ``table_versions`` table
+(migration 2), which triggers bump on every insert, update and delete. Checking
+``If-None-Match`` therefore costs one small query, and a 304 skips the real one.
+"""
+import json
+import hashlib
+
+from flask import request, Response, stream_with_context
+from sqlalchemy import text
+
+YIELD_PER = 1000
+NDJSON = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    fmt = request.args.get('format')
+    if fmt:
+        return fmt == 'ndjson'
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+
+def table_versions(session, tables):
+    """{table: change counter} for the given table_versions names."""
+    rows = session.execute(text('SELECT name, version FROM table_versions')).all()
+    versions = dict(rows)
+    return {t: versions.get(t, 0) for t in tables}
+
+
+def etag_for(session, tables):
+    """ETag of the current URL: changes when one of tables (or the requested format) does."""
+    versions = table_versions(session, tables)
+    key = repr((sorted(versions.items()), request.full_path, wants_ndjson()))
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def not_modified(tag):
+    """304 response if the client already has tag, else None."""
+    if request.if_none_match.contains_weak(tag):
+        r = Response(status=304)
+        r.set_etag(tag, weak=True)
+        return r
+    return None
+
+
+# one encoder for all rows; a whole chunk is encoded in a single call where the format allows it
+_encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+
+
+def _decoded(row, columns):
+    row = list(row)
+    for i in columns:
+        if row[i] is not None:
+            row[i] = json.loads(row[i])
+    return row
+
+
+def stream_rows(session, stmt, tag=None, json_columns=()):
+    """Response streaming the rows of stmt as a JSON array or NDJSON.
+
+    Columns named in json_columns hold JSON text and are sent as nested values.
+    """
+    result = session.execute(stmt.execution_options(yield_per=YIELD_PER))
+    keys = list(result.keys())
+    decode = [i for i, k in enumerate(keys) if k in json_columns]
+    ndjson = wants_ndjson()
+
+    def generate():
+        try:
+            if not ndjson:
+                yield '['
+            first = True
+            for chunk in result.partitions():
+                if decode:
+                    chunk = [_decoded(row, decode) for row in chunk]
+                objects = [dict(zip(keys, row)) for row in chunk]
+                if ndjson:
+                    yield ''.join(_encoder.encode(o) + '\n' for o in objects)
+                else:
+                    yield ('' if first else ',') + _encoder.encode(objects)[1:-1]
+                first = False
+            if not ndjson:
+                yield ']\n'
+        finally:
+            result.close()
+
+    r = Response(stream_with_context(generate()), mimetype=NDJSON if ndjson else 'application/json')
+    r.vary.add('Accept')
+    if tag:
+        r.set_etag(tag, weak=True)
+    return r
@@ -1,13 +1,23 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import select, inspect
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from shared import metrics
+import tracking
+import migrations
+import sqlite_profile
+import bulk_import
+import api
+import changes
+import search
+from cache import DetailCache
+from pagination import page_args, active_filters, prefix_filter, keyset_page
 
 BASE_DIR = os.path.dirname(__file__)
-DB_PATH = os.path.join(BASE_DIR, "week7_database.sqlite3")
+DB_PATH = os.environ.get("WEEK7_DB_PATH", os.path.join(BASE_DIR, "week7_database.sqlite3"))
 IMAGES_DIR = os.path.join(BASE_DIR, "static", "images")
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
@@ -15,8 +25,16 @@ app = Flask(__name__, template_folder="templates", static_folder="static")
 app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{DB_PATH}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["SECRET_KEY"] = "week7-secret"
+app.config["METRICS"] = os.environ.get("WEEK7_METRICS") == "1"
+# ?profile=1 writes files, so outside debug mode it needs WEEK7_METRICS_PROFILE=1 too
+app.config["METRICS_PROFILE"] = os.environ.get("WEEK7_METRICS_PROFILE") == "1"
+sqlite_profile.configure(app)
 
 db = SQLAlchemy(app)
+sqlite_profile.init_app(app, db)
+tracking.init_app(db)
+with app.app_context():
+    metrics.init_app(app, 'week7', db.engine)
 
 
 class Student(db.Model):
@@ -26,11 +44,17 @@ class Student(db.Model):
     roll_number = db.Column(db.String(120), unique=True, nullable=False)
     first_name = db.Column(db.String(120), nullable=False)
     last_name = db.Column(db.String(120))
-    enrollments = db.relationship("Enrollment", back_populates="student", cascade="all, delete-orphan")
+    # kept by triggers on enrollments (migration 7), never written by the app
+    enrolled_count = db.Column(db.Integer, nullable=False, server_default='0')
+    enrollments = db.relationship("Enrollment", back_populates="student", cascade="all, delete-orphan",
+                                  passive_deletes=True)
 
     def __repr__(self):
         return f"<Student {self.student_id} {self.roll_number}>"
 
+    def changed_entities(self):
+        return [('Student', self.student_id)]
+
 
 class Course(db.Model):
     __tablename__ = 'Course'
@@ -38,22 +62,85 @@ class Course(db.Model):
     course_code = db.Column(db.String(120), unique=True, nullable=False)
     course_name = db.Column(db.String(120), nullable=False)
     course_description = db.Column(db.String(1024))
-    enrollments = db.relationship("Enrollment", back_populates="course", cascade="all, delete-orphan")
+    enrolled_count = db.Column(db.Integer, nullable=False, server_default='0')
+    enrollments = db.relationship("Enrollment", back_populates="course", cascade="all, delete-orphan",
+                                  passive_deletes=True)
 
     def __repr__(self):
         return f"<Course {self.course_id} {self.course_code}>"
 
+    def changed_entities(self):
+        return [('Course', self.course_id)]
+
 
 class Enrollment(db.Model):
     __tablename__ = 'enrollments'
     enrollment_id = db.Column(db.Integer, primary_key=True)
     # the existing DB uses column names estudent_id and ecourse_id; map them here
-    student_id = db.Column('estudent_id', db.Integer, db.ForeignKey("Student.student_id"), nullable=False)
-    course_id = db.Column('ecourse_id', db.Integer, db.ForeignKey("Course.course_id"), nullable=False)
+    student_id = db.Column('estudent_id', db.Integer, db.ForeignKey("Student.student_id", ondelete="CASCADE"), nullable=False)
+    course_id = db.Column('ecourse_id', db.Integer, db.ForeignKey("Course.course_id", ondelete="CASCADE"), nullable=False)
 
     student = db.relationship("Student", back_populates="enrollments")
     course = db.relationship("Course", back_populates="enrollments")
 
+    def changed_entities(self):
+        # both the current and, if the row was moved, the previous student / course
+        state = inspect(self)
+        keys = []
+        for attr, model in (('student_id', 'Student'), ('course_id', 'Course')):
+            for value in [getattr(self, attr)] + list(state.attrs[attr].history.deleted or ()):
+                if value is not None:
+                    keys.append((model, value))
+        return keys
+
+
+# rendered detail payloads, dropped by tracking when a commit touches one of their rows
+details_cache = DetailCache(maxsize=app.config.get('DETAILS_CACHE_SIZE', 4096), ttl=app.config.get('DETAILS_CACHE_TTL', 300))
+tracking.subscribe(lambda tables, entities: details_cache.invalidate(entities))
+
+
+def apply_changes(tables, entities):
+    """Changes read from the change log, including other processes' writes (see changes.py)."""
+    if entities is None:
+        # the feed fell behind a prune and cannot say which rows changed
+        details_cache.clear()
+        entities = ()
+    tracking.changed(tables, entities)
+
+
+change_feed = changes.ChangeFeed(apply_changes, interval=app.config.get('CHANGE_FEED_INTERVAL', 1.0))
+
+
+@app.before_request
+def follow_changes():
+    change_feed.poll(db.session)
+
+
+# what the migrations put in place; one held back by existing rows leaves a gap here
+UNIQUE_KEYS = set()  # (table, column names) with a unique index or constraint
+CASCADE_DELETES = set()  # tables whose deletes cascade to their enrollments
+
+
+def init_schema():
+    """Create missing tables and apply pending migrations; safe to run from every worker.
+
+    A migration blocked by existing rows (duplicates for --merge-duplicates, orphans for
+    --drop-orphans) is logged and skipped rather than stopping the app.
+    """
+    with app.app_context():
+        db.create_all()
+    migrations.upgrade(DB_PATH, verbose=False, defer_blocked=True)
+    with app.app_context():
+        schema = inspect(db.engine)
+        for table in (Student.__tablename__, Course.__tablename__, Enrollment.__tablename__):
+            UNIQUE_KEYS.update((table, tuple(ix['column_names'])) for ix in schema.get_indexes(table) if ix['unique'])
+            UNIQUE_KEYS.update((table, tuple(uc['column_names'])) for uc in schema.get_unique_constraints(table))
+        CASCADE_DELETES.update(fk['referred_table'] for fk in schema.get_foreign_keys(Enrollment.__tablename__)
+                               if fk['options'].get('ondelete', '').upper() == 'CASCADE')
+
+
+init_schema()
+
 
 @app.route("/")
 def index():
@@ -62,10 +149,29 @@ def index():
 
 
 # Students
+def list_total(key, tables, stmt):
+    """Row count for a list page, cached until one of tables is written."""
+    return tracking.cached_count(key, tables, lambda: db.session.scalar(stmt))
+
+
+def students_query(roll):
+    """(rows, count) statements of the students list, filtered by roll number prefix."""
+    stmt = select(Student.student_id, Student.roll_number, Student.first_name, Student.last_name, Student.enrolled_count)
+    count = select(func.count()).select_from(Student)
+    if roll:
+        stmt = stmt.where(prefix_filter(Student.roll_number, roll))
+        count = count.where(prefix_filter(Student.roll_number, roll))
+    return stmt, count
+
+
 @app.route("/students")
 def students():
-    all_students = Student.query.order_by(Student.student_id).all()
-    return render_template("students.html", students=all_students)
+    after, limit, start = page_args()
+    roll = request.args.get('roll', '').strip()
+    stmt, count = students_query(roll)
+    total = list_total(('students', roll), {'Student'}, count)
+    page = keyset_page(db.session, stmt, Student.student_id, after, limit, start, total)
+    return render_template("students.html", students=page.rows, page=page, filters=active_filters(roll=roll))
 
 
 @app.route("/students/add", methods=["GET", "POST"])
@@ -74,6 +180,27 @@ def add_student():
     return redirect(url_for('create_student'))
 
 
+def insert_new(model, key, **values):
+    """Insert one row unless one with the same key exists, in a single statement
+    (INSERT ... ON CONFLICT DO NOTHING RETURNING). Returns the new row's id, or None
+    for a duplicate. The row's table and entities are noted for tracking; commit
+    is left to the caller."""
+    pk = inspect(model).primary_key[0]
+    if (model.__tablename__, tuple(c.expression.name for c in key)) in UNIQUE_KEYS:
+        stmt = sqlite_insert(model).values(**values).on_conflict_do_nothing(index_elements=key).returning(pk)
+        new_id = db.session.scalar(stmt)
+    elif db.session.scalar(select(pk).where(*(c == values[c.key] for c in key)).limit(1)) is None:
+        # no unique index to conflict on while its migration is skipped: check, then insert
+        new_id = db.session.scalar(sqlite_insert(model).values(**values).returning(pk))
+    else:
+        new_id = None
+    if new_id is not None:
+        # a Core insert, so tracking never sees an ORM object for it
+        entities = model(**values, **{pk.key: new_id}).changed_entities()
+        tracking.note_change(db.session, model.__table__.name, entities=entities)
+    return new_id
+
+
 @app.route('/student/create', methods=['GET', 'POST'])
 def create_student():
     if request.method == 'POST':
@@ -83,11 +210,9 @@ def create_student():
         if not roll or not first:
             flash('Roll and first name required', 'error')
             return redirect(url_for('create_student'))
-        exists = Student.query.filter_by(roll_number=roll).first()
-        if exists:
+        sid = insert_new(Student, [Student.roll_number], roll_number=roll, first_name=first, last_name=last)
+        if sid is None:
             return render_template('error.html', message='Student already exists. Please use different Roll Number !!')
-        s = Student(roll_number=roll, first_name=first, last_name=last)
-        db.session.add(s)
         db.session.commit()
         flash('Student added', 'success')
         return redirect(url_for('students'))
@@ -108,7 +233,11 @@ def edit_student(sid):
         s.roll_number = roll
         s.first_name = first
         s.last_name = last
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return render_template('error.html', message='Student already exists. Please use different Roll Number !!')
         flash("Student updated", "success")
         return redirect(url_for("students"))
     return render_template("student_form.html", student=s)
@@ -131,29 +260,54 @@ def update_student(student_id):
     return render_template('student_form.html', student=s, form_id='update-student-form', action_url=url_for('update_student', student_id=student_id), disable_roll=True)
 
 
+def delete_with_enrollments(obj):
+    """Delete a student or course with one DELETE; the database's ON DELETE CASCADE
+    (migration 5) removes its enrollments instead of the ORM loading and deleting each one."""
+    if obj.__tablename__ not in CASCADE_DELETES:
+        # migration 5 is skipped: the enrollments go in one DELETE of their own first
+        column = Enrollment.student_id if isinstance(obj, Student) else Enrollment.course_id
+        db.session.execute(db.delete(Enrollment).where(column == inspect(obj).identity[0]))
+    db.session.delete(obj)
+    # the ORM never sees those enrollments (passive_deletes), so tell tracking about them;
+    # the pages listing obj depend on its entity and are dropped through it
+    tracking.note_change(db.session, 'enrollments')
+    db.session.commit()
+
+
 @app.route('/student/<int:student_id>/delete', methods=['GET'])
 def delete_student_get(student_id):
-    s = Student.query.get_or_404(student_id)
-    db.session.delete(s)
-    db.session.commit()
+    delete_with_enrollments(Student.query.get_or_404(student_id))
     flash('Student deleted', 'success')
     return redirect(url_for('students'))
 
 
 @app.route("/students/<int:sid>/delete", methods=["POST"])
 def delete_student(sid):
-    s = Student.query.get_or_404(sid)
-    db.session.delete(s)
-    db.session.commit()
+    delete_with_enrollments(Student.query.get_or_404(sid))
     flash("Student deleted", "success")
     return redirect(url_for("students"))
 
 
 # Courses
+def courses_query(code):
+    """(rows, count) statements of the courses list, filtered by course code prefix."""
+    stmt = select(Course.course_id, Course.course_code, Course.course_name, Course.course_description,
+                  Course.enrolled_count)
+    count = select(func.count()).select_from(Course)
+    if code:
+        stmt = stmt.where(prefix_filter(Course.course_code, code))
+        count = count.where(prefix_filter(Course.course_code, code))
+    return stmt, count
+
+
 @app.route("/courses")
 def courses():
-    all_courses = Course.query.order_by(Course.course_id).all()
-    return render_template("courses.html", courses=all_courses)
+    after, limit, start = page_args()
+    code = request.args.get('code', '').strip()
+    stmt, count = courses_query(code)
+    total = list_total(('courses', code), {'Course'}, count)
+    page = keyset_page(db.session, stmt, Course.course_id, after, limit, start, total)
+    return render_template("courses.html", courses=page.rows, page=page, filters=active_filters(code=code))
 
 
 @app.route("/courses/add", methods=["GET", "POST"])
@@ -170,11 +324,9 @@ def create_course():
         if not code or not name:
             flash('Course code and name are required', 'error')
             return redirect(url_for('create_course'))
-        exists = Course.query.filter_by(course_code=code).first()
-        if exists:
+        cid = insert_new(Course, [Course.course_code], course_code=code, course_name=name, course_description=desc)
+        if cid is None:
             return render_template('error.html', message='Course already exists. Please create a different course !!')
-        c = Course(course_code=code, course_name=name, course_description=desc)
-        db.session.add(c)
         db.session.commit()
         flash('Course added', 'success')
         return redirect(url_for('courses'))
@@ -194,7 +346,11 @@ def edit_course(cid):
         c.course_code = code
         c.course_name = name
         c.course_description = desc
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return render_template('error.html', message='Course already exists. Please create a different course !!')
         flash("Course updated", "success")
         return redirect(url_for("courses"))
     return render_template("course_form.html", course=c)
@@ -219,43 +375,110 @@ def update_course(course_id):
 
 @app.route('/course/<int:course_id>/delete', methods=['GET'])
 def delete_course_get(course_id):
-    c = Course.query.get_or_404(course_id)
-    db.session.delete(c)
-    db.session.commit()
+    delete_with_enrollments(Course.query.get_or_404(course_id))
     flash('Course deleted', 'success')
     return redirect(url_for('courses'))
 
 
 @app.route("/courses/<int:cid>/delete", methods=["POST"])
 def delete_course(cid):
-    c = Course.query.get_or_404(cid)
-    db.session.delete(c)
-    db.session.commit()
+    delete_with_enrollments(Course.query.get_or_404(cid))
     flash("Course deleted", "success")
     return redirect(url_for("courses"))
 
 
+def enrollment_select():
+    """Enrollments joined with the student and course they link."""
+    return (
+        select(Enrollment.enrollment_id, Student.student_id, Student.roll_number, Student.first_name,
+               Student.last_name, Course.course_id, Course.course_code, Course.course_name)
+        .join(Student, Student.student_id == Enrollment.student_id)
+        .join(Course, Course.course_id == Enrollment.course_id)
+    )
+
+
+def enrollments_query(roll, code):
+    """(rows, count) statements of the enrollments list, filtered by roll number / course code prefix."""
+    stmt = enrollment_select()
+    count = (
+        select(func.count()).select_from(Enrollment)
+        .join(Student, Student.student_id == Enrollment.student_id)
+        .join(Course, Course.course_id == Enrollment.course_id)
+    )
+    if roll:
+        stmt = stmt.where(prefix_filter(Student.roll_number, roll))
+        count = count.where(prefix_filter(Student.roll_number, roll))
+    if code:
+        stmt = stmt.where(prefix_filter(Course.course_code, code))
+        count = count.where(prefix_filter(Course.course_code, code))
+    return stmt, count
+
+
+def enrollment_rows(page):
+    return [{
+        'enrollment_id': e.enrollment_id,
+        'student_id': e.student_id,
+        'roll_number': e.roll_number,
+        'student_name': f"{e.first_name} {e.last_name or ''}".strip(),
+        'course_id': e.course_id,
+        'course_code': e.course_code,
+        'course_name': e.course_name,
+    } for e in page.rows]
+
+
 @app.route('/enrollments')
 def enrollments():
-    # list enrollments showing student and course
-    rows = []
-    for e in Enrollment.query.all():
-        rows.append({
-            'enrollment_id': e.enrollment_id,
-            'student_id': e.student.student_id,
-            'roll_number': e.student.roll_number,
-            'student_name': f"{e.student.first_name} {e.student.last_name or ''}".strip(),
-            'course_id': e.course.course_id,
-            'course_code': e.course.course_code,
-            'course_name': e.course.course_name,
-        })
-    return render_template('enrollments.html', enrollments=rows)
+    # list enrollments showing student and course, one joined SELECT per page
+    after, limit, start = page_args()
+    roll = request.args.get('roll', '').strip()
+    code = request.args.get('code', '').strip()
+    stmt, count = enrollments_query(roll, code)
+    total = list_total(('enrollments', roll, code), {'enrollments', 'Student', 'Course'}, count)
+    page = keyset_page(db.session, stmt, Enrollment.enrollment_id, after, limit, start, total)
+    rows = enrollment_rows(page)
+    return render_template('enrollments.html', enrollments=rows, page=page, filters=active_filters(roll=roll, code=code))
+
+
+# typeahead options of the enrollment form: kind -> (table, key column the prefix matches, label columns)
+OPTION_SOURCES = {
+    'students': ('Student', Student.roll_number, (Student.student_id, Student.roll_number, Student.first_name, Student.last_name)),
+    'courses': ('Course', Course.course_code, (Course.course_id, Course.course_code, Course.course_name)),
+}
+OPTIONS_LIMIT = 20
+MAX_OPTIONS_LIMIT = 100
+
+# option lists by (kind, prefix, limit), dropped whenever their table is written
+options_cache = DetailCache(maxsize=app.config.get('OPTIONS_CACHE_SIZE', 1024), ttl=app.config.get('OPTIONS_CACHE_TTL', 60))
+tracking.subscribe(lambda tables, entities: options_cache.invalidate(('table', t) for t in tables))
+
+
+def options(kind, q, limit=OPTIONS_LIMIT):
+    """Up to limit {id, key, label} dicts of kind whose key starts with q, in key order."""
+    table, key, columns = OPTION_SOURCES[kind]
+    limit = max(1, min(limit, MAX_OPTIONS_LIMIT))
+    cache_key = (kind, q, limit)
+    found = options_cache.get(cache_key)
+    if found is None:
+        generation = options_cache.generation()
+        # an index range scan on the unique key, stopping after limit rows
+        stmt = select(*columns).order_by(key).limit(limit)
+        if q:
+            stmt = stmt.where(prefix_filter(key, q))
+        found = [{'id': row[0], 'key': row[1], 'label': f"{row[0]} - {row[1]} - " + ' '.join(v for v in row[2:] if v)}
+                 for row in db.session.execute(stmt)]
+        options_cache.put(cache_key, found, [('table', table)], generation)
+    return found
+
+
+@app.route('/api/v1/options/<any(students, courses):kind>')
+def api_options(kind):
+    """Typeahead: students by roll number or courses by code starting with ?q=."""
+    q = request.args.get('q', '').strip()
+    return jsonify(options(kind, q, request.args.get('limit', OPTIONS_LIMIT, type=int)))
 
 
 @app.route('/enrollments/add', methods=['GET', 'POST'])
 def add_enrollment():
-    students_list = Student.query.order_by(Student.student_id).all()
-    courses_list = Course.query.order_by(Course.course_id).all()
     if request.method == 'POST':
         sid_str = request.form.get('student')
         cid_str = request.form.get('course')
@@ -269,19 +492,22 @@ def add_enrollment():
             flash('Invalid selection', 'error')
             return redirect(url_for('add_enrollment'))
 
-        # avoid duplicate enrollment
-        exists = Enrollment.query.filter_by(student_id=sid, course_id=cid).first()
-        if exists:
+        # the unique (student, course) index turns a duplicate into "no row inserted"
+        try:
+            enid = insert_new(Enrollment, [Enrollment.student_id, Enrollment.course_id], student_id=sid, course_id=cid)
+        except IntegrityError:
+            # foreign key: no such student or course
+            db.session.rollback()
+            flash('Invalid selection', 'error')
+            return redirect(url_for('add_enrollment'))
+        if enid is None:
             flash('Enrollment already exists', 'error')
             return redirect(url_for('enrollments'))
-
-        # create using mapped attribute names (student_id/course_id) which map to DB columns
-        e = Enrollment(student_id=sid, course_id=cid)
-        db.session.add(e)
         db.session.commit()
         flash('Enrollment added', 'success')
         return redirect(url_for('enrollments'))
-    return render_template('enrollment_form.html', students=students_list, courses=courses_list)
+    # the first options of each list; the form's typeahead fetches the rest
+    return render_template('enrollment_form.html', students=options('students', ''), courses=options('courses', ''))
 
 
 @app.route('/enrollments/<int:enid>/delete', methods=['POST'])
@@ -293,6 +519,179 @@ def delete_enrollment(enid):
     return redirect(url_for('enrollments'))
 
 
+@app.route('/import', methods=['GET', 'POST'])
+def bulk_import_view():
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in bulk_import.LOADERS or not upload or not upload.filename:
+            flash('Please choose what to import and a file', 'error')
+            return redirect(url_for('bulk_import_view'))
+        fmt = request.form.get('format') or bulk_import.format_of(upload.filename)
+        try:
+            report = bulk_import.load(db.session, kind, bulk_import.text_stream(upload.stream), fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            db.session.rollback()
+            return render_template('error.html', message=f'Import failed: {e}'), 400
+        # a batch that broke a constraint was rolled back; the ones before it are in
+        status = 409 if report.failed else 200
+        if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+            return jsonify(report.as_dict()), status
+        return render_template('import.html', report=report), status
+    return render_template('import.html', report=None)
+
+
+def student_details(student_id):
+    """Load a student and the courses they are enrolled in with a single LEFT JOIN.
+
+    Returns (student, details) where student is a dict of the Student columns and
+    details a list of dicts per enrolled course, or None when the student does not exist.
+    """
+    return student_details_from(db.session.execute(student_details_select(student_id)).all())
+
+
+def student_details_select(student_id):
+    return (
+        select(Student.student_id, Student.roll_number, Student.first_name, Student.last_name,
+               Student.enrolled_count, Enrollment.enrollment_id, Course.course_id, Course.course_code, Course.course_name,
+               Course.course_description)
+        .outerjoin(Enrollment, Enrollment.student_id == Student.student_id)
+        .outerjoin(Course, Course.course_id == Enrollment.course_id)
+        .where(Student.student_id == student_id)
+        .order_by(Enrollment.enrollment_id)
+    )
+
+
+def student_details_from(result):
+    if not result:
+        return None
+    first = result[0]
+    student = {
+        'student_id': first.student_id,
+        'roll_number': first.roll_number,
+        'first_name': first.first_name,
+        'last_name': first.last_name,
+        'enrolled_count': first.enrolled_count,
+    }
+    details = []
+    for r in result:
+        if r.course_id is None:
+            continue
+        details.append({
+            'course_id': r.course_id,
+            'course_code': r.course_code,
+            'course_name': r.course_name,
+            'course_description': r.course_description,
+            'enrollment_id': r.enrollment_id,
+        })
+    return student, details
+
+
+def course_details(course_id):
+    """Load a course and its enrolled students with a single LEFT JOIN.
+
+    Returns (course, students) as dicts, or None when the course does not exist.
+    """
+    return course_details_from(db.session.execute(course_details_select(course_id)).all())
+
+
+def course_details_select(course_id):
+    return (
+        select(Course.course_id, Course.course_code, Course.course_name, Course.course_description,
+               Course.enrolled_count, Student.student_id, Student.roll_number, Student.first_name, Student.last_name)
+        .outerjoin(Enrollment, Enrollment.course_id == Course.course_id)
+        .outerjoin(Student, Student.student_id == Enrollment.student_id)
+        .where(Course.course_id == course_id)
+        .order_by(Enrollment.enrollment_id)
+    )
+
+
+def course_details_from(result):
+    if not result:
+        return None
+    first = result[0]
+    course = {
+        'course_id': first.course_id,
+        'course_code': first.course_code,
+        'course_name': first.course_name,
+        'course_description': first.course_description,
+        'enrolled_count': first.enrolled_count,
+    }
+    students = []
+    for r in result:
+        if r.student_id is None:
+            continue
+        students.append({
+            'student_id': r.student_id,
+            'roll_number': r.roll_number,
+            'first_name': r.first_name,
+            'last_name': r.last_name,
+        })
+    return course, students
+
+
+def student_deps(found):
+    student, details = found
+    return [('Student', student['student_id'])] + [('Course', d['course_id']) for d in details]
+
+
+def course_deps(found):
+    course, students = found
+    return [('Course', course['course_id'])] + [('Student', s['student_id']) for s in students]
+
+
+def cached_student_details(student_id):
+    """student_details() through details_cache."""
+    key = ('student', student_id)
+    found = details_cache.get(key)
+    if found is None:
+        generation = details_cache.generation()
+        found = student_details(student_id)
+        if found:
+            details_cache.put(key, found, student_deps(found), generation)
+    return found
+
+
+def cached_course_details(course_id):
+    """course_details() through details_cache."""
+    key = ('course', course_id)
+    found = details_cache.get(key)
+    if found is None:
+        generation = details_cache.generation()
+        found = course_details(course_id)
+        if found:
+            details_cache.put(key, found, course_deps(found), generation)
+    return found
+
+
+@app.route('/search')
+def search_view():
+    """Students and courses matching ?q= (every word as a prefix); JSON for typeahead clients."""
+    q = request.args.get('q', '').strip()
+    kinds = [k for k in request.args.getlist('kind') if k in search.KINDS] or list(search.KINDS)
+    limit = request.args.get('limit', search.LIMIT, type=int)
+    found = search.search(db.session, q, kinds, limit) if q else {kind: [] for kind in kinds}
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json' \
+            or request.args.get('format') == 'json':
+        return jsonify(q=q, **found)
+    return render_template('search.html', q=q, found=found)
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(details_cache.stats())
+
+
+def student_context(student, details):
+    student_name = f"{student['first_name']} {student['last_name'] or ''}".strip()
+    return dict(error=None, details=details, student_id=student['student_id'], student_name=student_name, roll_number=student['roll_number'],
+                enrolled_count=student['enrolled_count'])
+
+
+def render_student(student, details):
+    return render_template('student.html', **student_context(student, details))
+
+
 # Enrollment / search similar to Week4
 @app.route("/student", methods=["GET"])
 def student_view():
@@ -304,40 +703,18 @@ def student_view():
     except ValueError:
         return render_template("student.html", error="Invalid student id", details=None)
 
-    student = Student.query.get(sid_i)
-    if not student:
+    found = cached_student_details(sid_i)
+    if not found:
         return render_template("student.html", error=f"Student id {sid_i} not found", details=None)
-    details = []
-    for e in student.enrollments:
-        # include course id, name and description
-        details.append({
-            "course_id": e.course.course_id,
-            "course_code": e.course.course_code,
-            "course_name": e.course.course_name,
-            "course_description": e.course.course_description,
-        })
-
-    student_name = f"{student.first_name} {student.last_name or ''}".strip()
-    roll_number = student.roll_number
-
-    return render_template("student.html", error=None, details=details, student_id=student.student_id, student_name=student_name, roll_number=roll_number)
+    return render_student(*found)
 
 
 @app.route('/student/<int:student_id>', methods=['GET'])
 def student_view_by_id(student_id):
-    student = Student.query.get_or_404(student_id)
-    details = []
-    for e in student.enrollments:
-        details.append({
-            'course_id': e.course.course_id,
-            'course_code': e.course.course_code,
-            'course_name': e.course.course_name,
-            'course_description': e.course.course_description,
-            'enrollment_id': e.enrollment_id,
-        })
-    student_name = f"{student.first_name} {student.last_name or ''}".strip()
-    roll_number = student.roll_number
-    return render_template('student.html', error=None, details=details, student_id=student.student_id, student_name=student_name, roll_number=roll_number)
+    found = cached_student_details(student_id)
+    if not found:
+        abort(404)
+    return render_student(*found)
 
 
 @app.route('/student/<int:student_id>/withdraw/<int:course_id>', methods=['GET'])
@@ -365,42 +742,113 @@ def course_view():
     except ValueError:
         return render_template("course.html", error="Invalid course id", avg=None, maxm=None, img_path=None)
 
-    course = Course.query.get(cid_i)
-    if not course:
+    found = cached_course_details(cid_i)
+    if not found:
         return render_template("course.html", error=f"Course id {cid_i} not found", details=None, course=None)
 
     # list enrolled students
-    students = []
-    for e in course.enrollments:
-        st = e.student
-        students.append({
-            "student_id": st.student_id,
-            "roll_number": st.roll_number,
-            "first_name": st.first_name,
-            "last_name": st.last_name,
-        })
-
+    course, students = found
     return render_template("course.html", error=None, details=students, course=course)
 
 
 @app.route('/course/<int:course_id>', methods=['GET'])
 def course_view_by_id(course_id):
-    course = Course.query.get_or_404(course_id)
-    students = []
-    for e in course.enrollments:
-        st = e.student
-        students.append({
-            'student_id': st.student_id,
-            'roll_number': st.roll_number,
-            'first_name': st.first_name,
-            'last_name': st.last_name,
-        })
+    found = cached_course_details(course_id)
+    if not found:
+        abort(404)
+    course, students = found
     return render_template('course.html', error=None, details=students, course=course)
 
 
+# JSON API (see api.py); collections accept ?after=<id> and the same prefix filters as the list pages
+API_TABLES = ('students', 'courses', 'enrollments')
+
+
+def api_collection(stmt, key, tables):
+    tag = api.etag_for(db.session, tables)
+    cached = api.not_modified(tag)
+    if cached:
+        return cached
+    after = request.args.get('after', type=int)
+    if after is not None:
+        stmt = stmt.where(key > after)
+    return api.stream_rows(db.session, stmt.order_by(key), tag)
+
+
+def api_object(tables, load):
+    # load() reads the database after the ETag's versions were read, so the body is at least as
+    # new as the tag. It must not go through details_cache: that cache sees other workers' writes
+    # only after the change-feed poll, so a new ETag could go out with an old body, and clients
+    # would then get 304s for that stale copy until the next write
+    tag = api.etag_for(db.session, tables)
+    cached = api.not_modified(tag)
+    if cached:
+        return cached
+    body = load()
+    if body is None:
+        return jsonify(error='not found'), 404
+    r = jsonify(body)
+    r.set_etag(tag, weak=True)
+    return r
+
+
+@app.route('/api/v1/students')
+def api_students():
+    stmt, _ = students_query(request.args.get('roll', '').strip())
+    return api_collection(stmt, Student.student_id, ('students',))
+
+
+@app.route('/api/v1/courses')
+def api_courses():
+    stmt, _ = courses_query(request.args.get('code', '').strip())
+    return api_collection(stmt, Course.course_id, ('courses',))
+
+
+@app.route('/api/v1/enrollments')
+def api_enrollments():
+    stmt, _ = enrollments_query(request.args.get('roll', '').strip(), request.args.get('code', '').strip())
+    return api_collection(stmt, Enrollment.enrollment_id, API_TABLES)
+
+
+@app.route('/api/v1/changes')
+def api_changes():
+    """Changes after ?since=<seq> (at most ?limit=), oldest first; X-Changes-Head is the newest seq."""
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    until = changes.head(db.session)
+    if changes.missing(db.session, since):
+        r = jsonify(error='changes after since were pruned; reload the collections and follow on from head',
+                    head=until)
+        r.status_code = 410
+    else:
+        r = api.stream_rows(db.session, changes.changes_select(since, until, limit), json_columns=('data', 'old'))
+    r.headers['X-Changes-Head'] = str(until)
+    return r
+
+
+@app.route('/api/v1/students/<int:student_id>')
+def api_student(student_id):
+    def load():
+        found = student_details(student_id)
+        return found and {**found[0], 'courses': found[1]}
+    return api_object(API_TABLES, load)
+
+
+@app.route('/api/v1/courses/<int:course_id>')
+def api_course(course_id):
+    def load():
+        found = course_details(course_id)
+        return found and {**found[0], 'students': found[1]}
+    return api_object(API_TABLES, load)
+
+
+@app.route('/api/v1/enrollments/<int:enrollment_id>')
+def api_enrollment(enrollment_id):
+    def load():
+        row = db.session.execute(enrollment_select().where(Enrollment.enrollment_id == enrollment_id)).first()
+        return row and row._asdict()
+    return api_object(API_TABLES, load)
+
+
 if __name__ == "__main__":
-    # ensure DB exists
-    if not os.path.exists(DB_PATH):
-        with app.app_context():
-            db.create_all()
     app.run(debug=True)
@@ -0,0 +1,189 @@
+"""ASGI entry point for the Week 7 app.
+
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:app --workers 4
+
+The read-heavy pages (the students / courses / enrollments lists and the student
+and course detail pages) are Quart views that await an aiosqlite-backed async
+SQLAlchemy engine, so a request waiting on SQLite does not hold a worker thread.
+Every other route (forms, writes, /import, the JSON API) is handed to the Flask
+app in app.py through asgiref's WsgiToAsgi. Both modes use the same models,
+queries, templates and in-process caches, and writes made through the Flask
+routes keep invalidating the caches the async views read.
+"""
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, request, render_template, abort
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.exceptions import NotFound, MethodNotAllowed
+
+import app as wsgi
+import tracking
+import sqlite_profile
+from pagination import page_args, active_filters, keyset_select, make_page
+from app import Student, Course, Enrollment
+
+engine = create_async_engine(f"sqlite+aiosqlite:///{wsgi.DB_PATH}", **wsgi.app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+sqlite_profile.listen(engine.sync_engine, sqlite_profile.pragmas_for(wsgi.app.config["SQLITE_PROFILE"], wsgi.app.config.get("SQLITE_PRAGMAS")))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+quart_app = Quart(__name__, template_folder="templates", static_folder="static")
+quart_app.config["SECRET_KEY"] = wsgi.app.config["SECRET_KEY"]  # same session cookie, so flashed messages carry over
+
+
+@quart_app.after_serving
+async def dispose_engine():
+    await engine.dispose()
+
+
+@quart_app.before_request
+async def follow_changes():
+    # the Flask side polls the change log in its own before_request
+    if wsgi.change_feed.due():
+        async with Session() as session:
+            await session.run_sync(wsgi.change_feed.poll)
+
+
+async def list_total(session, key, tables, stmt):
+    total = tracking.peek_count(key)
+    if total is None:
+        token = tracking.count_token(tables)
+        total = await session.scalar(stmt)
+        tracking.store_count(key, tables, total, token)
+    return total
+
+
+async def keyset_page(session, stmt, key, after, limit, start, total):
+    rows = (await session.execute(keyset_select(stmt, key, after, limit))).all()
+    return make_page(rows, key, after, limit, start, total)
+
+
+async def cached_details(key, stmt, build, deps):
+    """Async counterpart of app.cached_student_details / cached_course_details."""
+    found = wsgi.details_cache.get(key)
+    if found is None:
+        generation = wsgi.details_cache.generation()
+        async with Session() as session:
+            found = build((await session.execute(stmt)).all())
+        if found:
+            wsgi.details_cache.put(key, found, deps(found), generation)
+    return found
+
+
+def student_details(student_id):
+    return cached_details(('student', student_id), wsgi.student_details_select(student_id),
+                          wsgi.student_details_from, wsgi.student_deps)
+
+
+def course_details(course_id):
+    return cached_details(('course', course_id), wsgi.course_details_select(course_id),
+                          wsgi.course_details_from, wsgi.course_deps)
+
+
+@quart_app.route("/students", endpoint="students")
+async def students():
+    after, limit, start = page_args(request.args)
+    roll = request.args.get('roll', '').strip()
+    stmt, count = wsgi.students_query(roll)
+    async with Session() as session:
+        total = await list_total(session, ('students', roll), {'Student'}, count)
+        page = await keyset_page(session, stmt, Student.student_id, after, limit, start, total)
+    return await render_template("students.html", students=page.rows, page=page, filters=active_filters(roll=roll))
+
+
+@quart_app.route("/courses", endpoint="courses")
+async def courses():
+    after, limit, start = page_args(request.args)
+    code = request.args.get('code', '').strip()
+    stmt, count = wsgi.courses_query(code)
+    async with Session() as session:
+        total = await list_total(session, ('courses', code), {'Course'}, count)
+        page = await keyset_page(session, stmt, Course.course_id, after, limit, start, total)
+    return await render_template("courses.html", courses=page.rows, page=page, filters=active_filters(code=code))
+
+
+@quart_app.route("/enrollments", endpoint="enrollments")
+async def enrollments():
+    after, limit, start = page_args(request.args)
+    roll = request.args.get('roll', '').strip()
+    code = request.args.get('code', '').strip()
+    stmt, count = wsgi.enrollments_query(roll, code)
+    async with Session() as session:
+        total = await list_total(session, ('enrollments', roll, code), {'enrollments', 'Student', 'Course'}, count)
+        page = await keyset_page(session, stmt, Enrollment.enrollment_id, after, limit, start, total)
+    return await render_template('enrollments.html', enrollments=wsgi.enrollment_rows(page), page=page,
+                                 filters=active_filters(roll=roll, code=code))
+
+
+@quart_app.route("/student", endpoint="student_view")
+async def student_view():
+    sid = request.args.get("s")
+    if not sid:
+        return await render_template("student.html", error="No student id provided", details=None)
+    try:
+        sid_i = int(sid)
+    except ValueError:
+        return await render_template("student.html", error="Invalid student id", details=None)
+    found = await student_details(sid_i)
+    if not found:
+        return await render_template("student.html", error=f"Student id {sid_i} not found", details=None)
+    return await render_template('student.html', **wsgi.student_context(*found))
+
+
+@quart_app.route("/student/<int:student_id>", endpoint="student_view_by_id")
+async def student_view_by_id(student_id):
+    found = await student_details(student_id)
+    if not found:
+        abort(404)
+    return await render_template('student.html', **wsgi.student_context(*found))
+
+
+@quart_app.route("/course", endpoint="course_view")
+async def course_view():
+    cid = request.args.get("c")
+    if not cid:
+        return await render_template("course.html", error="No course id provided", avg=None, maxm=None, img_path=None)
+    try:
+        cid_i = int(cid)
+    except ValueError:
+        return await render_template("course.html", error="Invalid course id", avg=None, maxm=None, img_path=None)
+    found = await course_details(cid_i)
+    if not found:
+        return await render_template("course.html", error=f"Course id {cid_i} not found", details=None, course=None)
+    course, students = found
+    return await render_template("course.html", error=None, details=students, course=course)
+
+
+@quart_app.route("/course/<int:course_id>", endpoint="course_view_by_id")
+async def course_view_by_id(course_id):
+    found = await course_details(course_id)
+    if not found:
+        abort(404)
+    course, students = found
+    return await render_template('course.html', error=None, details=students, course=course)
+
+
+# the remaining Flask routes are registered without a view so url_for() in the
+# templates can build their URLs; requests for them never reach Quart
+NATIVE = {rule.endpoint for rule in quart_app.url_map.iter_rules()}
+for rule in wsgi.app.url_map.iter_rules():
+    if rule.endpoint not in NATIVE:
+        quart_app.add_url_rule(rule.rule, rule.endpoint, methods=rule.methods)
+
+flask_app = WsgiToAsgi(wsgi.app)
+_routes = quart_app.url_map.bind("")
+
+
+def is_native(path, method):
+    try:
+        endpoint, _ = _routes.match(path, method)
+    except (NotFound, MethodNotAllowed):
+        return False
+    return endpoint in NATIVE
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http" and not is_native(scope["path"], scope["method"]):
+        await flask_app(scope, receive, send)
+    else:
+        # native routes, static files and lifespan events
+        await quart_app(scope, receive, send)
@@ -0,0 +1,93 @@
+"""Benchmark of deleting a course with many enrollments.
+
+Builds a scratch copy of the database with enough students, then for each size
+creates a course with that many enrollments and deletes it two ways:
+
+- ``orm``: every enrollment is loaded into the session and deleted one by one,
+  as the relationships' ``cascade="all, delete-orphan"`` did before
+  ``passive_deletes`` (the write lock is held for all of it);
+- ``cascade``: ``POST /courses/<id>/delete``, one DELETE of the course whose
+  enrollments go through ``ON DELETE CASCADE`` (migration 5).
+
+    python bench_deletes.py --sizes 1000 10000 100000 --repeat 3
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import statistics
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def add_students(path, n):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany('INSERT OR IGNORE INTO Student (roll_number, first_name) VALUES (?, ?)',
+                         ((f'BD{i:07d}', 'Bench') for i in range(n)))
+    conn.close()
+
+
+def add_course(path, code, n):
+    """A new course with the first n bench students enrolled; returns its id."""
+    conn = sqlite3.connect(path)
+    with conn:
+        cid = conn.execute('INSERT INTO Course (course_code, course_name) VALUES (?, ?) RETURNING course_id',
+                           (code, 'Bench')).fetchone()[0]
+        conn.execute('''INSERT INTO enrollments (estudent_id, ecourse_id)
+                        SELECT student_id, ? FROM Student WHERE roll_number LIKE 'BD%' ORDER BY student_id LIMIT ?''',
+                     (cid, n))
+    conn.close()
+    return cid
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time course deletes by number of enrollments.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    path = os.path.join(work, 'bench.sqlite3')
+    shutil.copy(os.path.join(BASE_DIR, 'week7_database.sqlite3'), path)
+    os.environ['WEEK7_DB_PATH'] = path
+    sys.path.insert(0, BASE_DIR)
+    try:
+        from app import app, db, Course
+        add_students(path, max(args.sizes))
+        client = app.test_client()
+
+        def orm_delete(cid):
+            with app.app_context():
+                c = db.session.get(Course, cid)
+                for e in c.enrollments:
+                    db.session.delete(e)
+                db.session.delete(c)
+                db.session.commit()
+
+        def cascade_delete(cid):
+            r = client.post(f'/courses/{cid}/delete')
+            if r.status_code != 302:
+                raise RuntimeError(f'/courses/{cid}/delete -> {r.status_code}')
+
+        print(f"{'enrollments':>11} {'method':<8} {'median ms':>10} {'min ms':>8}")
+        n = 0
+        for size in args.sizes:
+            for method, delete in (('orm', orm_delete), ('cascade', cascade_delete)):
+                samples = []
+                for _ in range(args.repeat):
+                    n += 1
+                    cid = add_course(path, f'BD-{n}', size)
+                    started = time.perf_counter()
+                    delete(cid)
+                    samples.append(time.perf_counter() - started)
+                print(f'{size:>11} {method:<8} {statistics.median(samples) * 1000:>10.1f} {min(samples) * 1000:>8.1f}')
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Read/write concurrency benchmark for the SQLite profiles in sqlite_profile.py.
+
+Starts reader and writer processes (like gunicorn workers) against a scratch
+copy of the database and runs them for a fixed time. Writers insert a student and
+an enrollment per transaction, as create_student + add_enrollment do. Readers run
+the course detail query. Reports throughput, p50/p99 latency and how many
+operations failed with "database is locked", once per profile:
+
+    python bench_sqlite.py --readers 4 --writers 2 --seconds 5
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import sqlite_profile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+READ_SQL = text('''SELECT c.course_id, c.course_code, s.student_id, s.roll_number, s.first_name, s.last_name
+                   FROM Course c LEFT JOIN enrollments e ON e.ecourse_id = c.course_id
+                   LEFT JOIN Student s ON s.student_id = e.estudent_id
+                   WHERE c.course_id = :cid''')
+
+
+def worker(kind, path, profile, seconds, seed, out):
+    engine = create_engine(f'sqlite:///{path}', **sqlite_profile.ENGINE_OPTIONS)
+    sqlite_profile.listen(engine, sqlite_profile.pragmas_for(profile))
+    latencies, errors, n = [], 0, 0
+    with engine.connect() as conn:
+        course_ids = [r[0] for r in conn.execute(text('SELECT course_id FROM Course'))]
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                cid = course_ids[n % len(course_ids)]
+                if kind == 'read':
+                    conn.execute(READ_SQL, {'cid': cid}).all()
+                else:
+                    sid = conn.execute(text('INSERT INTO Student (roll_number, first_name) VALUES (:r, :f) RETURNING student_id'),
+                                       {'r': f'B{seed}-{n}', 'f': 'Bench'}).scalar()
+                    conn.execute(text('INSERT INTO enrollments (estudent_id, ecourse_id) VALUES (:s, :c)'), {'s': sid, 'c': cid})
+            latencies.append(time.perf_counter() - t0)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            errors += 1
+        n += 1
+    engine.dispose()
+    out.put((kind, latencies, errors))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(profile, readers, writers, seconds):
+    tmpdir = tempfile.mkdtemp()
+    path = os.path.join(tmpdir, 'bench.sqlite3')
+    shutil.copy(os.path.join(BASE_DIR, 'week7_database.sqlite3'), path)
+    if profile == 'default':
+        # WAL is persistent in the file, make sure the comparison starts from a rollback journal
+        with create_engine(f'sqlite:///{path}').connect() as conn:
+            conn.exec_driver_sql('PRAGMA journal_mode = DELETE')
+    out = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=('read', path, profile, seconds, i, out)) for i in range(readers)]
+    procs += [multiprocessing.Process(target=worker, args=('write', path, profile, seconds, i, out)) for i in range(writers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    shutil.rmtree(tmpdir, ignore_errors=True)
+
+    summary = {}
+    for kind in ('read', 'write'):
+        lat = [x for k, l, _ in results if k == kind for x in l]
+        errors = sum(e for k, _, e in results if k == kind)
+        summary[kind] = {
+            'ops_per_sec': len(lat) / seconds,
+            'p50_ms': percentile(lat, 50) * 1000,
+            'p99_ms': percentile(lat, 99) * 1000,
+            'locked_errors': errors,
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare SQLite profiles under concurrent readers and writers.')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--profile', choices=sorted(sqlite_profile.PROFILES), action='append',
+                        help='profile(s) to run (default: all)')
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds}s per profile')
+    print(f"{'profile':<8} {'kind':<6} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    for profile in args.profile or sorted(sqlite_profile.PROFILES):
+        for kind, r in run(profile, args.readers, args.writers, args.seconds).items():
+            print(f"{profile:<8} {kind:<6} {r['ops_per_sec']:>9.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['locked_errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""Bulk loading of students, courses and enrollments from CSV or JSON Lines.
+
+Rows are streamed from the input, checked against ids / unique keys that are
+read into memory once up front (instead of one SELECT per row), and inserted with
+executemany in large batches, one transaction per batch. Rows that fail a check
+are skipped and reported with their line number. If a batch still breaks a
+constraint (another writer added the same key or deleted a referenced row after
+the checks were loaded), it is rolled back and the import stops there; the
+batches before it stay committed and the report names the failed one.
+
+    python bulk_import.py students students.csv
+    python bulk_import.py enrollments enrollments.jsonl --batch-size 20000
+
+CSV files need a header row. Column names are the database names
+(roll_number, first_name, last_name / course_code, course_name,
+course_description); the form names (roll, f_name, l_name / code, c_name, desc)
+are accepted too. Enrollments take student_id + course_id or
+roll_number + course_code.
+"""
+import io
+import csv
+import json
+import time
+import argparse
+from collections import Counter
+
+from sqlalchemy import table, column, select, insert, delete, update, bindparam
+from sqlalchemy.exc import IntegrityError
+
+import tracking
+
+BATCH_SIZE = 5000
+MAX_REPORTED = 100  # rejected rows listed individually in the report
+
+STUDENT = table('Student', column('student_id'), column('roll_number'), column('first_name'), column('last_name'),
+                column('enrolled_count'))
+COURSE = table('Course', column('course_id'), column('course_code'), column('course_name'), column('course_description'),
+               column('enrolled_count'))
+ENROLLMENT = table('enrollments', column('enrollment_id'), column('estudent_id'), column('ecourse_id'))
+TABLE_VERSIONS = table('table_versions', column('name'), column('version'))
+BULK_WRITES = table('bulk_writes', column('name'))
+
+ALIASES = {
+    'roll': 'roll_number', 'f_name': 'first_name', 'l_name': 'last_name',
+    'code': 'course_code', 'c_name': 'course_name', 'desc': 'course_description',
+    'student': 'student_id', 'course': 'course_id',
+}
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []  # (line, reason), at most MAX_REPORTED
+        self.failed = None  # (first line, last line, rows, reason) of the batch that was rolled back
+        self.seconds = 0.0
+
+    def reject(self, line, reason):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED:
+            self.errors.append((line, reason))
+
+    @property
+    def rows_per_sec(self):
+        return self.inserted / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'read': self.read,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'errors': [{'line': line, 'reason': reason} for line, reason in self.errors],
+            'failed_batch': self.failed and dict(zip(('first_line', 'last_line', 'rows', 'reason'), self.failed)),
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+
+def read_records(stream, fmt):
+    """Yield (line number, dict) from a text stream in csv or jsonl format."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for n, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = e
+            yield n, record
+    else:
+        raise ValueError(f"Unknown format {fmt!r}, expected csv or jsonl")
+
+
+def _clean(record):
+    out = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        key = ALIASES.get(key.strip(), key.strip())
+        out[key] = value.strip() if isinstance(value, str) else value
+    return out
+
+
+class _Loader:
+    """Validates rows of one kind; check() returns the row to insert or a reject reason."""
+
+    versions = ()  # table_versions names bumped once per batch
+    deferred = ()  # other bulk_writes names whose per-row triggers after_insert() replaces
+
+    def __init__(self, session):
+        self.session = session
+
+    def entities(self, rows):
+        """Existing rows whose cached pages are affected by inserting rows."""
+        return ()
+
+    def after_insert(self, rows):
+        """Set-wise work of the deferred triggers for a batch of inserted rows."""
+
+
+class _Students(_Loader):
+    target = STUDENT
+    versions = ('students',)
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.rolls = set(session.scalars(select(STUDENT.c.roll_number)))
+
+    def check(self, r):
+        roll, first = r.get('roll_number'), r.get('first_name')
+        if roll in (None, '') or not first:
+            return 'roll_number and first_name are required'
+        roll = str(roll)  # JSON may give a number; the column and the set hold text
+        if roll in self.rolls:
+            return f'roll_number {roll} already exists'
+        self.rolls.add(roll)
+        return {'roll_number': roll, 'first_name': first, 'last_name': r.get('last_name') or None}
+
+
+class _Courses(_Loader):
+    target = COURSE
+    versions = ('courses',)
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.codes = set(session.scalars(select(COURSE.c.course_code)))
+
+    def check(self, r):
+        code, name = r.get('course_code'), r.get('course_name')
+        if code in (None, '') or not name:
+            return 'course_code and course_name are required'
+        code = str(code)
+        if code in self.codes:
+            return f'course_code {code} already exists'
+        self.codes.add(code)
+        return {'course_code': code, 'course_name': name, 'course_description': r.get('course_description') or None}
+
+
+class _Enrollments(_Loader):
+    target = ENROLLMENT
+    # enrolled_count of students and courses changes too
+    versions = ('enrollments', 'students', 'courses')
+    deferred = ('enrolled_count',)
+
+    def __init__(self, session):
+        super().__init__(session)
+        self.students = dict(session.execute(select(STUDENT.c.roll_number, STUDENT.c.student_id)).all())
+        self.courses = dict(session.execute(select(COURSE.c.course_code, COURSE.c.course_id)).all())
+        self.student_ids = set(self.students.values())
+        self.course_ids = set(self.courses.values())
+        self.pairs = set(session.execute(select(ENROLLMENT.c.estudent_id, ENROLLMENT.c.ecourse_id)).all())
+
+    @staticmethod
+    def _resolve(r, id_key, name_key, by_name, ids):
+        if r.get(id_key) not in (None, ''):
+            try:
+                value = int(r[id_key])
+            except (TypeError, ValueError):
+                return None
+            return value if value in ids else None
+        name = r.get(name_key)
+        return None if name is None else by_name.get(str(name))
+
+    def check(self, r):
+        sid = self._resolve(r, 'student_id', 'roll_number', self.students, self.student_ids)
+        if sid is None:
+            return 'unknown student'
+        cid = self._resolve(r, 'course_id', 'course_code', self.courses, self.course_ids)
+        if cid is None:
+            return 'unknown course'
+        if (sid, cid) in self.pairs:
+            return 'enrollment already exists'
+        self.pairs.add((sid, cid))
+        return {'estudent_id': sid, 'ecourse_id': cid}
+
+    def entities(self, rows):
+        return {('Student', r['estudent_id']) for r in rows} | {('Course', r['ecourse_id']) for r in rows}
+
+    def after_insert(self, rows):
+        # one UPDATE per student / course in the batch instead of two per enrollment
+        for target, pk, col in ((STUDENT, 'student_id', 'estudent_id'), (COURSE, 'course_id', 'ecourse_id')):
+            added = Counter(r[col] for r in rows)
+            self.session.execute(update(target).where(target.c[pk] == bindparam('row_id'))
+                                 .values(enrolled_count=target.c.enrolled_count + bindparam('added')),
+                                 [{'row_id': k, 'added': n} for k, n in added.items()])
+
+
+LOADERS = {'students': _Students, 'courses': _Courses, 'enrollments': _Enrollments}
+
+
+def load(session, kind, stream, fmt='csv', batch_size=BATCH_SIZE):
+    """Import rows of kind ('students', 'courses' or 'enrollments') from a text stream.
+
+    Stops at the first batch the database rejects; report.failed then describes it.
+    """
+    if kind not in LOADERS:
+        raise ValueError(f"Unknown kind {kind!r}, expected one of {sorted(LOADERS)}")
+    report = ImportReport(kind)
+    started = time.perf_counter()
+    loader = LOADERS[kind](session)
+    batch, lines = [], []
+
+    def flush():
+        if batch:
+            try:
+                # the per-row table_versions / enrolled_count triggers are off for this
+                # transaction; their work is done once for the batch (migration 8)
+                session.execute(insert(BULK_WRITES), [{'name': name} for name in loader.versions + loader.deferred])
+                session.execute(insert(loader.target), batch)
+                loader.after_insert(batch)
+                session.execute(delete(BULK_WRITES))
+                session.execute(update(TABLE_VERSIONS).where(TABLE_VERSIONS.c.name.in_(loader.versions))
+                                .values(version=TABLE_VERSIONS.c.version + 1))
+                tracking.note_change(session, loader.target.name, entities=loader.entities(batch))
+                session.commit()
+            except IntegrityError as e:
+                session.rollback()
+                report.failed = (lines[0], lines[-1], len(batch), str(e.orig))
+                return False
+            report.inserted += len(batch)
+            del batch[:], lines[:]
+        return True
+
+    for line, record in read_records(stream, fmt):
+        report.read += 1
+        if not isinstance(record, dict):
+            report.reject(line, f'not a record: {record}')
+            continue
+        row = loader.check(_clean(record))
+        if isinstance(row, str):
+            report.reject(line, row)
+            continue
+        batch.append(row)
+        lines.append(line)
+        if len(batch) >= batch_size and not flush():
+            break
+    else:
+        flush()
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def format_of(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def text_stream(binary):
+    """Wrap an uploaded (binary) file so it can be read line by line without loading it whole."""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import students, courses or enrollments.')
+    parser.add_argument('kind', choices=sorted(LOADERS))
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='default: from the file extension')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from app import app, db
+    with app.app_context(), open(args.file, encoding='utf-8-sig', newline='') as f:
+        report = load(db.session, args.kind, f, args.format or format_of(args.file), args.batch_size)
+    print(f'{report.kind}: read {report.read}, inserted {report.inserted}, rejected {report.rejected} '
+          f'in {report.seconds:.2f}s ({report.rows_per_sec:.0f} rows/s)')
+    for line, reason in report.errors:
+        print(f'  line {line}: {reason}')
+    if report.rejected > len(report.errors):
+        print(f'  ... {report.rejected - len(report.errors)} more')
+    if report.failed:
+        first, last, rows, reason = report.failed
+        raise SystemExit(f'stopped: the batch of {rows} rows from lines {first}-{last} was rolled back ({reason})')
+
+
+if __name__ == '__main__':
+    main()
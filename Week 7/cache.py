@@ -0,0 +1,95 @@
+"""Bounded LRU + TTL cache for the student / course detail payloads.
+
+Every entry lists the entities it was built from (for a student page: the
+student and each course it shows). ``invalidate`` drops exactly the entries that
+depend on a changed entity, so an edit to one course only evicts that course's
+page and the pages of the students enrolled in it.
+
+An entry is only stored when no invalidation happened while it was being loaded
+from the database, so a commit racing with a read cannot leave a stale payload
+behind. The TTL bounds how long a change made by another process can stay
+invisible.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+
+class DetailCache:
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires, deps, value), least recently used first
+        self._by_dep = {}  # entity -> keys of entries built from it
+        self._generation = 0  # bumped by every invalidation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self):
+        """Token to pass to put(); taken before loading the value."""
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value, deps, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, frozenset(deps), value)
+            for dep in deps:
+                self._by_dep.setdefault(dep, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        _, deps, _ = self._entries.pop(key)
+        for dep in deps:
+            keys = self._by_dep.get(dep)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_dep[dep]
+
+    def invalidate(self, entities):
+        with self._lock:
+            self._generation += 1
+            for entity in entities:
+                for key in list(self._by_dep.get(entity, ())):
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_dep.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,157 @@
+"""Change log of the Student, Course and enrollments tables (migration 3).
+
+Triggers append a row to ``changes`` for every insert, update and delete: a
+sequence number, the table ('students', 'courses', 'enrollments'), the
+operation, the row id and the row as JSON (``data`` after the change, ``old``
+before it). SQLite runs one write transaction at a time and ``seq`` is
+AUTOINCREMENT, so sequence numbers follow commit order: a reader that has seen
+everything up to N never finds a new change at or below N later.
+
+Other systems follow the log through ``/api/v1/changes?since=N``; in the app,
+ChangeFeed passes changes made by other processes to the in-process caches.
+
+    python changes.py --head          last sequence number
+    python changes.py --prune 100000  keep only the newest 100000 changes
+"""
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+from sqlalchemy import text
+
+from init_db import DB_PATH
+
+# changes.tbl -> (table name as tracking knows it, entity of the row itself)
+TABLES = {'students': ('Student', 'Student'), 'courses': ('Course', 'Course'), 'enrollments': ('enrollments', None)}
+
+HEAD = text("SELECT seq FROM sqlite_sequence WHERE name = 'changes'")
+OLDEST = text('SELECT MIN(seq) FROM changes')
+
+
+def head(session):
+    """Sequence number of the newest change (0 before the first one)."""
+    return session.scalar(HEAD) or 0
+
+
+def missing(session, since):
+    """True when changes after since were already pruned, so a reader at since has to start over."""
+    oldest = session.scalar(OLDEST)
+    if oldest is None:
+        return since < head(session)
+    return since < oldest - 1
+
+
+def changes_select(since, until, limit=None):
+    """Changes with since < seq <= until, oldest first, in the shape /api/v1/changes sends them."""
+    sql = ('SELECT seq, tbl AS "table", op, row_id AS id, data, old FROM changes '
+           'WHERE seq > :since AND seq <= :until ORDER BY seq')
+    if limit is not None:
+        sql += ' LIMIT :limit'
+    return text(sql).bindparams(since=since, until=until, **({} if limit is None else {'limit': limit}))
+
+
+def entities(tbl, row_id, data, old):
+    """Rows a change affects, as tracking's (model, id) entities."""
+    found = set()
+    own = TABLES[tbl][1]
+    if own:
+        found.add((own, row_id))
+    else:
+        # an enrollment shows up on the pages of its student and course, before and after the change
+        for image in (data, old):
+            if image:
+                image = json.loads(image)
+                found.add(('Student', image['student_id']))
+                found.add(('Course', image['course_id']))
+    return found
+
+
+class ChangeFeed:
+    """Hands changes committed by any process to callback(tables, entities).
+
+    poll() is called on every request but reads the log at most once per
+    ``interval`` seconds; ``interval=None`` turns the feed off. Changes from
+    before the first poll are skipped. When the feed fell behind a prune,
+    or more than ``max_batch`` changes behind (a bulk import, say), callback
+    gets every table and ``entities=None``: everything may have changed.
+    """
+
+    def __init__(self, callback, interval=1.0, max_batch=10000):
+        self.callback = callback
+        self.interval = interval
+        self.max_batch = max_batch
+        self.seq = None
+        self._due = 0.0
+        self._lock = threading.Lock()
+
+    def due(self):
+        """True when the next poll() would read the log."""
+        return self.interval is not None and time.monotonic() >= self._due
+
+    def poll(self, session):
+        if not self.due():
+            return
+        # one thread reads the log, the others go on without waiting for it
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._due = time.monotonic() + self.interval
+            if self.seq is None:
+                self.seq = head(session)
+                return
+            rows = session.execute(
+                text('SELECT seq, tbl, row_id, data, old FROM changes WHERE seq > :seq ORDER BY seq LIMIT :n'),
+                {'seq': self.seq, 'n': self.max_batch + 1}).all()
+            if not rows:
+                return
+            # seq has no holes (a rolled back insert does not use up its number) except where
+            # prune() deleted rows, so a jump means changes this feed has not seen are gone
+            if rows[0][0] != self.seq + 1 or len(rows) > self.max_batch:
+                self.seq = head(session)
+                self.callback({table for table, _ in TABLES.values()}, None)
+                return
+            tables, touched = set(), set()
+            for seq, tbl, row_id, data, old in rows:
+                tables.add(TABLES[tbl][0])
+                touched |= entities(tbl, row_id, data, old)
+            self.seq = rows[-1][0]
+            self.callback(tables, touched)
+        finally:
+            self._lock.release()
+
+
+def prune(path, keep):
+    """Delete all but the newest keep changes; returns how many were removed."""
+    if keep < 1:
+        # the newest change stays, so readers can tell a pruned log from an idle one
+        raise ValueError('keep at least one change')
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            cur = conn.execute('DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?', (keep,))
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or prune the Week 7 change log.')
+    parser.add_argument('--db', default=DB_PATH, help='SQLite file (default: %(default)s)')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--head', action='store_true', help='print the newest sequence number')
+    group.add_argument('--prune', type=int, metavar='KEEP', help='keep only the newest KEEP changes')
+    args = parser.parse_args()
+
+    if args.head:
+        conn = sqlite3.connect(args.db)
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+        conn.close()
+        print(row[0] if row else 0)
+    else:
+        print(f'removed {prune(args.db, args.prune)} changes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Check that the list and detail pages run a fixed number of SQL statements.
+
+Works on a scratch copy of week7_database.sqlite3 (the real file is not touched),
+adds extra enrollments so an N+1 pattern would show up, then counts the
+statements each route executes:
+
+    python check_queries.py
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRATCH = os.path.join(tempfile.mkdtemp(), 'week7_check.sqlite3')
+shutil.copy(os.path.join(BASE_DIR, 'week7_database.sqlite3'), SCRATCH)
+os.environ['WEEK7_DB_PATH'] = SCRATCH
+
+from sqlalchemy import event
+from app import app, db, details_cache, options_cache, change_feed
+
+# statements allowed per page, independent of how many rows it shows
+BUDGET = {
+    # list pages: the page itself plus the total, which is cached after the first view
+    '/students': 2,
+    '/courses': 2,
+    '/enrollments': 2,
+    '/student/{sid}': 1,
+    '/student?s={sid}': 1,
+    '/course/{cid}': 1,
+    '/course?c={cid}': 1,
+    # API: the table_versions lookup for the ETag plus the data itself
+    '/api/v1/students': 2,
+    '/api/v1/enrollments': 2,
+    '/api/v1/students/{sid}': 2,
+    '/api/v1/courses/{cid}': 2,
+    # change log: its head, the oldest kept change (for the pruned check) and the changes
+    '/api/v1/changes?since=0': 3,
+    # search: per kind, a capped count of the matches and the (ranked) hits
+    '/search?q=a': 4,
+    # enrollment form: the first options of each list; typeahead: one range scan of the key index
+    '/enrollments/add': 2,
+    '/api/v1/options/students?q=R': 1,
+    '/api/v1/options/courses?q=C': 1,
+}
+
+
+def seed(path):
+    """Enroll the first student in every course and every student in the first course."""
+    con = sqlite3.connect(path)
+    sids = [r[0] for r in con.execute('SELECT student_id FROM Student ORDER BY student_id')]
+    cids = [r[0] for r in con.execute('SELECT course_id FROM Course ORDER BY course_id')]
+    pairs = {(sids[0], c) for c in cids} | {(s, cids[0]) for s in sids}
+    existing = set(con.execute('SELECT estudent_id, ecourse_id FROM enrollments'))
+    con.executemany('INSERT INTO enrollments (estudent_id, ecourse_id) VALUES (?, ?)', sorted(pairs - existing))
+    con.commit()
+    con.close()
+    return sids[0], cids[0]
+
+
+def main():
+    sid, cid = seed(SCRATCH)
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+    client = app.test_client()
+    # the change log is read at most once a second; keep that poll out of the per-page counts
+    change_feed.interval = None
+    failed = False
+    for pattern, allowed in BUDGET.items():
+        path = pattern.format(sid=sid, cid=cid)
+        # measure the database path, not the caches
+        details_cache.clear()
+        options_cache.clear()
+        del statements[:]
+        r = client.get(path)
+        r.close()  # finish streamed responses inside this request
+        ok = r.status_code == 200 and len(statements) <= allowed
+        failed = failed or not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {path} -> {r.status_code}, {len(statements)} queries (budget {allowed})")
+        if not ok:
+            for sql in statements:
+                print('     ', ' '.join(sql.split())[:120])
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
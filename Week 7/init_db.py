@@ -7,7 +7,35 @@ Run this from the Week 7 directory (or with python pointing to project root):
 import sqlite3
 import os
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'week7_database.sqlite3')
+DB_PATH = os.environ.get('WEEK7_DB_PATH', os.path.join(os.path.dirname(__file__), 'week7_database.sqlite3'))
+
+
+def list_tables(cur):
+    """Names of the tables in the database."""
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return [r[0] for r in cur.fetchall()]
+
+
+def find_table(tables, name):
+    """Find the actual table name for name (exact case-insensitive match first, then substring)."""
+    low = name.lower()
+    for t in tables:
+        if t.lower() == low:
+            return t
+    for t in tables:
+        if low in t.lower():
+            return t
+    return None
+
+
+def enrollment_columns(cur, enroll_table):
+    """Return the (student, course) foreign key column names of the enrollments table."""
+    cols = [c[1] for c in cur.execute(f"PRAGMA table_info('{enroll_table}')")]
+    s_col = next((c for c in cols if 'student' in c.lower()), None)
+    c_col = next((c for c in cols if 'course' in c.lower()), None)
+    if not s_col or not c_col:
+        raise RuntimeError(f"Cannot determine student/course columns in {enroll_table}: {cols}")
+    return s_col, c_col
 
 
 def init_db():
@@ -21,20 +49,9 @@ def init_db():
     cur.execute('PRAGMA foreign_keys = ON')
 
     # detect existing tables (case-insensitive search for expected names)
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [r[0] for r in cur.fetchall()]
-
-    def find_table(name):
-        low = name.lower()
-        for t in tables:
-            if t.lower() == low:
-                return t
-        for t in tables:
-            if low in t.lower():
-                return t
-        return None
-
-    student_table = find_table('student')
+    tables = list_tables(cur)
+
+    student_table = find_table(tables, 'student')
     if not student_table:
         student_table = 'student'
         cur.execute(
@@ -45,7 +62,7 @@ def init_db():
                 last_name TEXT
             )''')
 
-    course_table = find_table('course')
+    course_table = find_table(tables, 'course')
     if not course_table:
         course_table = 'course'
         cur.execute(
@@ -56,25 +73,24 @@ def init_db():
                 course_description TEXT
             )''')
 
-    enroll_table = find_table('enrollments')
+    enroll_table = find_table(tables, 'enrollments')
     if not enroll_table:
         enroll_table = 'enrollments'
         cur.execute(
             '''CREATE TABLE IF NOT EXISTS enrollments (
                 enrollment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                student_id INTEGER NOT NULL,
-                course_id INTEGER NOT NULL,
-                FOREIGN KEY(student_id) REFERENCES student(student_id),
-                FOREIGN KEY(course_id) REFERENCES course(course_id)
+                estudent_id INTEGER NOT NULL,
+                ecourse_id INTEGER NOT NULL,
+                FOREIGN KEY(estudent_id) REFERENCES student(student_id) ON DELETE CASCADE,
+                FOREIGN KEY(ecourse_id) REFERENCES course(course_id) ON DELETE CASCADE
             )''')
 
     # refresh table list after potential creation
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [r[0] for r in cur.fetchall()]
+    tables = list_tables(cur)
     # ensure our variables point to actual names
-    student_table = find_table('student') or student_table
-    course_table = find_table('course') or course_table
-    enroll_table = find_table('enrollments') or enroll_table
+    student_table = find_table(tables, 'student') or student_table
+    course_table = find_table(tables, 'course') or course_table
+    enroll_table = find_table(tables, 'enrollments') or enroll_table
 
     # example students and courses
     students = [
@@ -88,13 +104,11 @@ def init_db():
         ("CS101", "Programming", "Intro to programming"),
     ]
 
-    # insert students (roll_number unique) - use INSERT OR IGNORE
-    for roll, first, last in students:
-        cur.execute(f"INSERT OR IGNORE INTO {student_table} (roll_number, first_name, last_name) VALUES (?, ?, ?)", (roll, first, last))
+    # insert students (roll_number unique) - use INSERT OR IGNORE, one executemany for all rows
+    cur.executemany(f"INSERT OR IGNORE INTO {student_table} (roll_number, first_name, last_name) VALUES (?, ?, ?)", students)
 
     # insert courses
-    for code, name, desc in courses:
-        cur.execute("INSERT OR IGNORE INTO course (course_code, course_name, course_description) VALUES (?, ?, ?)", (code, name, desc))
+    cur.executemany(f"INSERT OR IGNORE INTO {course_table} (course_code, course_name, course_description) VALUES (?, ?, ?)", courses)
 
     conn.commit()
 
@@ -119,22 +133,25 @@ def init_db():
         ]
 
         # determine actual column names in enrollments table
-        cols = [c[1] for c in cur.execute(f"PRAGMA table_info('{enroll_table}')")]
-        s_col = next((c for c in cols if 'student' in c.lower()), None)
-        c_col = next((c for c in cols if 'course' in c.lower()), None)
-        if not s_col or not c_col:
-            raise RuntimeError(f"Cannot determine student/course columns in {enroll_table}: {cols}")
-
-        for sid, cid in examples:
-            cur.execute(f"INSERT INTO {enroll_table} ({s_col}, {c_col}) VALUES (?, ?)", (sid, cid))
+        s_col, c_col = enrollment_columns(cur, enroll_table)
+
+        cur.executemany(f"INSERT INTO {enroll_table} ({s_col}, {c_col}) VALUES (?, ?)", examples)
         conn.commit()
         print('Inserted example enrollments.')
     else:
         print('Enrollments already present; skipping enrollment insertion.')
 
-    print('init_db: done. DB file:', DB_PATH)
     conn.close()
 
+    # indexes, constraints and other schema changes made after the tables were created
+    import migrations
+    try:
+        version = migrations.upgrade(DB_PATH)
+    except migrations.MigrationBlocked as e:
+        raise SystemExit(str(e))
+    print('init_db: schema version', version)
+    print('init_db: done. DB file:', DB_PATH)
+
 
 if __name__ == '__main__':
     # import the Flask app and use its context when initializing the DB
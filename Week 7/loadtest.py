@@ -0,0 +1,103 @@
+"""Compare requests/sec and latency of running Week 7 servers.
+
+Start the app in both modes (see README), then point this script at them:
+
+    gunicorn -w 4 --threads 8 -b 127.0.0.1:8000 app:app
+    uvicorn asgi:app --workers 4 --port 8001
+    python loadtest.py --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001
+
+Each target is loaded in turn by --processes client processes with
+--concurrency keep-alive connections in total, cycling through --path for
+--seconds. Non-2xx answers and connection errors are counted as errors.
+"""
+import time
+import argparse
+import threading
+import http.client
+import multiprocessing
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = ['/students', '/courses', '/enrollments', '/student/3', '/course/1']
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def _client(base, paths, deadline, latencies, errors):
+    url = urlsplit(base)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    i = 0
+    while time.time() < deadline:
+        path = url.path.rstrip('/') + paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            r = conn.getresponse()
+            r.read()
+            if r.status >= 300:
+                errors.append(r.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def _process(base, paths, connections, deadline, out):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_client, args=(base, paths, deadline, latencies, errors))
+               for _ in range(connections)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    out.put((latencies, len(errors)))
+
+
+def run(base, paths, concurrency, processes, seconds):
+    """Load base for seconds; returns (requests/sec, p50 ms, p99 ms, errors)."""
+    out = multiprocessing.Queue()
+    deadline = time.time() + seconds
+    per_process = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+    workers = [multiprocessing.Process(target=_process, args=(base, paths, n, deadline, out))
+               for n in per_process if n]
+    for w in workers:
+        w.start()
+    latencies, errors = [], 0
+    for _ in workers:
+        lat, err = out.get()
+        latencies.extend(lat)
+        errors += err
+    for w in workers:
+        w.join()
+    latencies.sort()
+    return len(latencies) / seconds, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test running Week 7 servers (WSGI vs ASGI).')
+    parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                        help='server to test, e.g. wsgi=http://127.0.0.1:8000 (repeat for each mode)')
+    parser.add_argument('--path', action='append', help=f'path to request (repeatable, default: {DEFAULT_PATHS})')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    paths = args.path or DEFAULT_PATHS
+    print(f"{'target':<8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for target in args.target:
+        name, _, base = target.partition('=')
+        rps, p50, p99, errors = run(base or name, paths, args.concurrency, args.processes, args.seconds)
+        print(f'{name:<8} {rps:>9.0f} {p50:>8.2f} {p99:>8.2f} {errors:>7}')
+
+
+if __name__ == '__main__':
+    main()
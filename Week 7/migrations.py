@@ -0,0 +1,584 @@
+"""Versioned schema migrations for the Week 7 database.
+
+Each migration has a number and runs once; the number of the last applied one is
+kept in SQLite's ``PRAGMA user_version``. Table and column names are looked up
+with the same discovery helpers init_db.py uses, because databases created by
+hand and by init_db.py name them differently.
+
+    python migrations.py            apply pending migrations
+    python migrations.py --check    also show EXPLAIN QUERY PLAN for the hot queries
+                                    and fail if one of them does not use an index
+    python migrations.py --recount  also recompute enrolled_count of every student and course
+    python migrations.py --merge-duplicates
+                                    first merge duplicate rows that stop a migration
+    python migrations.py --drop-orphans
+                                    first delete enrollments of missing students / courses
+"""
+import os
+import re
+import sqlite3
+import logging
+import argparse
+
+from init_db import DB_PATH, list_tables, find_table, enrollment_columns
+
+MIGRATIONS = []
+log = logging.getLogger(__name__)
+
+
+def migration(version, description, check=None):
+    """Register fn as migration version. check(cur, t), if given, returns the rows that
+    stop it from being applied as (what they are, rows, how to remove them)."""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn, check))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+class Schema:
+    """Actual table and column names of a database."""
+
+    def __init__(self, cur):
+        tables = list_tables(cur)
+        self.student = find_table(tables, 'student')
+        self.course = find_table(tables, 'course')
+        self.enrollments = find_table(tables, 'enrollments')
+        if not (self.student and self.course and self.enrollments):
+            raise RuntimeError(f"Student, Course and enrollments tables are required, found {tables}")
+        self.e_student, self.e_course = enrollment_columns(cur, self.enrollments)
+
+
+def _pairs_blocking(cur, t):
+    # the unique index cannot be built over duplicate pairs; dropping them is left to --merge-duplicates
+    rows = [(t.enrollments,) + row for row in _duplicate_pairs(cur, t)]
+    return 'enrollments of the same student in the same course', rows, MERGE
+
+
+@migration(1, 'index enrollments by (student, course) and (course, student), one enrollment per pair',
+           check=_pairs_blocking)
+def _enrollment_indexes(cur, t):
+    cur.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS ux_enrollments_student_course '
+                f'ON {t.enrollments} ({t.e_student}, {t.e_course})')
+    cur.execute(f'CREATE INDEX IF NOT EXISTS ix_enrollments_course_student '
+                f'ON {t.enrollments} ({t.e_course}, {t.e_student})')
+
+
+@migration(2, 'per-table change counters (table_versions) kept by triggers')
+def _table_versions(cur, t):
+    cur.execute('CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+    for name, table in (('students', t.student), ('courses', t.course), ('enrollments', t.enrollments)):
+        # start at a random value so a recreated database does not repeat old ETags
+        cur.execute('INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, abs(random() % 1000000000))', (name,))
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            cur.execute(f'''CREATE TRIGGER IF NOT EXISTS tv_{name}_{op.lower()} AFTER {op} ON {table}
+                            BEGIN UPDATE table_versions SET version = version + 1 WHERE name = '{name}'; END''')
+
+
+def _columns(cur, table):
+    return [c[1] for c in cur.execute(f"PRAGMA table_info('{table}')")]
+
+
+@migration(3, 'append-only change log (changes) kept by triggers')
+def _change_log(cur, t):
+    # seq is AUTOINCREMENT so it is never reused, even after old rows are pruned
+    cur.execute('''CREATE TABLE IF NOT EXISTS changes (
+                       seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                       tbl TEXT NOT NULL,
+                       op TEXT NOT NULL,
+                       row_id INTEGER NOT NULL,
+                       data TEXT,
+                       old TEXT)''')
+    enrollment_keys = {'enrollment_id': 'enrollment_id', t.e_student: 'student_id', t.e_course: 'course_id'}
+    for name, table, pk, keys in (
+            ('students', t.student, 'student_id', {c: c for c in _columns(cur, t.student)}),
+            ('courses', t.course, 'course_id', {c: c for c in _columns(cur, t.course)}),
+            ('enrollments', t.enrollments, 'enrollment_id', enrollment_keys)):
+        def image(row):
+            # the row as a JSON object, enrollments with the API's student_id / course_id names
+            return 'json_object(' + ', '.join(f"'{key}', {row}.{col}" for col, key in keys.items()) + ')'
+        for op, row_id, data, old in (('insert', f'NEW.{pk}', image('NEW'), 'NULL'),
+                                      ('update', f'NEW.{pk}', image('NEW'), image('OLD')),
+                                      ('delete', f'OLD.{pk}', 'NULL', image('OLD'))):
+            cur.execute(f'''CREATE TRIGGER IF NOT EXISTS chg_{name}_{op} AFTER {op.upper()} ON {table}
+                            BEGIN INSERT INTO changes (tbl, op, row_id, data, old)
+                                  VALUES ('{name}', '{op}', {row_id}, {data}, {old}); END''')
+
+
+# full-text indexes: FTS5 table -> (source table attribute on Schema, its primary key, indexed columns)
+FTS_TABLES = {
+    'student_fts': ('student', 'student_id', ('roll_number', 'first_name', 'last_name')),
+    'course_fts': ('course', 'course_id', ('course_code', 'course_name', 'course_description')),
+}
+
+
+@migration(4, 'FTS5 search indexes over students and courses kept by triggers')
+def _search_indexes(cur, t):
+    for fts, (source, pk, cols) in FTS_TABLES.items():
+        table = getattr(t, source)
+        names = ', '.join(cols)
+        # external content: the index points at the table's rows instead of keeping a copy;
+        # the prefix indexes make "abc*" queries for typeahead a direct lookup
+        cur.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+                    f"content_rowid='{pk}', prefix='1 2 3')")
+        new = ', '.join(f'NEW.{c}' for c in cols)
+        old = ', '.join(f'OLD.{c}' for c in cols)
+        add = f'INSERT INTO {fts} (rowid, {names}) VALUES (NEW.{pk}, {new});'
+        remove = f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', OLD.{pk}, {old});"
+        for op, body in (('insert', add), ('update', remove + ' ' + add), ('delete', remove)):
+            cur.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_{op} AFTER {op.upper()} ON {table} BEGIN {body} END')
+        cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+
+def _foreign_keys(cur, t):
+    # foreign_key_list rows: (id, seq, table, from, to, on_update, on_delete, match)
+    return {fk[3]: fk for fk in cur.execute(f"PRAGMA foreign_key_list('{t.enrollments}')")}
+
+
+def _has_cascade(cur, t):
+    fks = _foreign_keys(cur, t)
+    return all(col in fks and fks[col][6] == 'CASCADE' for col in (t.e_student, t.e_course))
+
+
+def _orphaned(t):
+    return (f'{t.e_student} NOT IN (SELECT student_id FROM {t.student}) '
+            f'OR {t.e_course} NOT IN (SELECT course_id FROM {t.course})')
+
+
+def _orphans(cur, t):
+    """Enrollments whose student or course no longer exists."""
+    return cur.execute(f'SELECT * FROM {t.enrollments} WHERE {_orphaned(t)} ORDER BY enrollment_id').fetchall()
+
+
+def _orphans_blocking(cur, t):
+    # the new foreign keys would reject them; deleting them is left to --drop-orphans
+    rows = [] if _has_cascade(cur, t) else [(t.enrollments,) + row for row in _orphans(cur, t)]
+    return ('enrollments whose student or course does not exist', rows,
+            'run "python migrations.py --drop-orphans" to delete them')
+
+
+@migration(5, 'enrollments foreign keys ON DELETE CASCADE, so deleting a student or course is one statement',
+           check=_orphans_blocking)
+def _cascade_enrollments(cur, t):
+    if _has_cascade(cur, t):
+        return
+    fks = _foreign_keys(cur, t)
+    # SQLite cannot change a foreign key in place: rebuild the table under its own name
+    columns = []
+    for _, name, type_, notnull, default, pk in cur.execute(f"PRAGMA table_info('{t.enrollments}')"):
+        if pk:
+            columns.append(f'{name} INTEGER PRIMARY KEY AUTOINCREMENT')
+        else:
+            columns.append(f'{name} {type_}' + (' NOT NULL' if notnull else '') +
+                           (f' DEFAULT {default}' if default is not None else ''))
+    for col, parent, key in ((t.e_student, t.student, 'student_id'), (t.e_course, t.course, 'course_id')):
+        on_update = fks[col][5] if col in fks else 'NO ACTION'
+        columns.append(f'FOREIGN KEY ({col}) REFERENCES {parent}({key}) ON DELETE CASCADE ON UPDATE {on_update}')
+    seq = cur.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (t.enrollments,)).fetchone()
+    # indexes and triggers go with the old table; they are created again as they were
+    kept = [sql for (sql,) in cur.execute("""SELECT sql FROM sqlite_master WHERE tbl_name = ?
+                                              AND type IN ('index', 'trigger') AND sql IS NOT NULL""",
+                                          (t.enrollments,))]
+    cur.execute(f'CREATE TABLE {t.enrollments}_new (' + ', '.join(columns) + ')')
+    cur.execute(f'INSERT INTO {t.enrollments}_new SELECT * FROM {t.enrollments}')
+    cur.execute(f'DROP TABLE {t.enrollments}')
+    cur.execute(f'ALTER TABLE {t.enrollments}_new RENAME TO {t.enrollments}')
+    if seq:
+        # ids of deleted enrollments stay used, as they were with the old table
+        cur.execute('UPDATE sqlite_sequence SET seq = ? WHERE name = ?', (seq[0], t.enrollments))
+    for sql in kept:
+        cur.execute(sql)
+
+
+def _has_unique_index(cur, table, column):
+    for _, index, unique, *_ in cur.execute(f"PRAGMA index_list('{table}')").fetchall():
+        if unique and [c[2] for c in cur.execute(f"PRAGMA index_info('{index}')")] == [column]:
+            return True
+    return False
+
+
+# (table attribute on Schema, primary key, unique key, enrollments column pointing at it, the other one, index)
+UNIQUE_KEYS = (
+    ('student', 'student_id', 'roll_number', 'e_student', 'e_course', 'ux_student_roll_number'),
+    ('course', 'course_id', 'course_code', 'e_course', 'e_student', 'ux_course_code'),
+)
+REPORT_ROWS = 20
+MERGE = 'run "python migrations.py --merge-duplicates" to keep the oldest row of each'
+
+
+class MigrationBlocked(RuntimeError):
+    """Rows in the database stop pending migrations; none of the pending ones was applied.
+
+    blocked is [(version, description, what, rows, fix)], version the schema version
+    the database is still at.
+    """
+
+    def __init__(self, blocked, version):
+        self.blocked = blocked
+        self.version = version
+        super().__init__(report(blocked, version))
+
+
+def report(blocked, version, skipped=False):
+    lines = []
+    for number, description, what, rows, fix in blocked:
+        lines.append(f'Migration {number} ({description}) is blocked by {len(rows)} {what}:')
+        lines += [f'  {row}' for row in rows[:REPORT_ROWS]]
+        if len(rows) > REPORT_ROWS:
+            lines.append(f'  ... and {len(rows) - REPORT_ROWS} more')
+        lines.append(f'Review them, then {fix}.')
+    if skipped:
+        lines.append('These migrations are skipped until then; the others are applied.')
+    else:
+        lines.append(f'The database is at schema version {version}; no pending migration was applied.')
+    return '\n'.join(lines)
+
+
+def _duplicate_keys(cur, table, pk, key):
+    """Every row of table whose key another row has too, grouped by key."""
+    return cur.execute(f'''SELECT * FROM {table} WHERE {key} IN (
+                               SELECT {key} FROM {table} GROUP BY {key} HAVING COUNT(*) > 1)
+                           ORDER BY {key}, {pk}''').fetchall()
+
+
+def _duplicate_pairs(cur, t):
+    """Every enrollment whose (student, course) pair another enrollment has too."""
+    return cur.execute(f'''SELECT * FROM {t.enrollments} WHERE ({t.e_student}, {t.e_course}) IN (
+                               SELECT {t.e_student}, {t.e_course} FROM {t.enrollments}
+                               GROUP BY {t.e_student}, {t.e_course} HAVING COUNT(*) > 1)
+                           ORDER BY {t.e_student}, {t.e_course}, enrollment_id''').fetchall()
+
+
+def _drop_doubled(cur, t, student, course):
+    """Delete all but the oldest enrollment of each (student, course) pair, as the given
+    expressions compute it; returns the rows removed."""
+    doubled = f'''enrollment_id NOT IN (SELECT MIN(enrollment_id) FROM {t.enrollments} GROUP BY {student}, {course})'''
+    removed = [(t.enrollments,) + row for row in
+               cur.execute(f'SELECT * FROM {t.enrollments} WHERE {doubled} ORDER BY enrollment_id')]
+    cur.execute(f'DELETE FROM {t.enrollments} WHERE {doubled}')
+    return removed
+
+
+def _merge_keys(cur, t):
+    """Merge rows sharing a roll number / course code into the oldest one and drop doubled
+    enrollments; returns the rows removed."""
+    removed = _drop_doubled(cur, t, t.e_student, t.e_course)
+    for source, pk, key, e_attr, other_attr, _ in UNIQUE_KEYS:
+        table, e_col, e_other = getattr(t, source), getattr(t, e_attr), getattr(t, other_attr)
+        # every duplicate row -> the oldest row with the same key
+        cur.execute('DROP TABLE IF EXISTS temp.merged')
+        cur.execute('CREATE TEMP TABLE merged (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)')
+        cur.execute(f'''INSERT INTO merged
+                        SELECT d.{pk}, k.keep_id
+                        FROM {table} d JOIN (SELECT {key}, MIN({pk}) AS keep_id FROM {table} GROUP BY {key}) k
+                             ON k.{key} = d.{key} AND d.{pk} != k.keep_id''')
+        if cur.execute('SELECT COUNT(*) FROM merged').fetchone()[0]:
+            removed += [(table,) + row for row in
+                        cur.execute(f'SELECT * FROM {table} WHERE {pk} IN (SELECT old_id FROM merged) ORDER BY {pk}')]
+            # the duplicates' enrollments move to the kept row; where that would enroll it
+            # twice in the same course, only the oldest enrollment of the pair stays
+            mapped = f'COALESCE((SELECT new_id FROM merged WHERE old_id = {e_col}), {e_col})'
+            removed += _drop_doubled(cur, t, mapped, e_other)
+            cur.execute(f'UPDATE {t.enrollments} SET {e_col} = {mapped} WHERE {e_col} IN (SELECT old_id FROM merged)')
+            cur.execute(f'DELETE FROM {table} WHERE {pk} IN (SELECT old_id FROM merged)')
+        cur.execute('DROP TABLE temp.merged')
+    return removed
+
+
+def _keys_blocking(cur, t):
+    # merging duplicates throws rows away, so it is never done as a side effect of
+    # starting the app: the migration is held back and --merge-duplicates does it
+    rows = []
+    for source, pk, key, _, _, _ in UNIQUE_KEYS:
+        table = getattr(t, source)
+        if not _has_unique_index(cur, table, key):
+            rows += [(table,) + row for row in _duplicate_keys(cur, table, pk, key)]
+    return 'students / courses sharing a roll number / course code', rows, MERGE
+
+
+@migration(6, 'unique roll_number and course_code', check=_keys_blocking)
+def _unique_keys(cur, t):
+    for source, _, key, _, _, index in UNIQUE_KEYS:
+        table = getattr(t, source)
+        if not _has_unique_index(cur, table, key):
+            cur.execute(f'CREATE UNIQUE INDEX {index} ON {table} ({key})')
+
+
+def recount_enrollments(cur, t):
+    """Set enrolled_count of every student and course from the enrollments table, one
+    GROUP BY per table; only rows whose count was wrong are written. Returns how many."""
+    fixed = 0
+    for table, pk, col in ((t.student, 'student_id', t.e_student), (t.course, 'course_id', t.e_course)):
+        cur.execute(f'''UPDATE {table} SET enrolled_count = c.n
+                        FROM (SELECT p.{pk} AS id, COUNT(e.{col}) AS n
+                              FROM {table} p LEFT JOIN {t.enrollments} e ON e.{col} = p.{pk}
+                              GROUP BY p.{pk}) c
+                        WHERE c.id = {table}.{pk} AND {table}.enrolled_count != c.n''')
+        fixed += cur.rowcount
+    return fixed
+
+
+@migration(7, 'enrolled_count on students and courses kept by triggers on enrollments')
+def _enrolled_counts(cur, t):
+    for name, table, fts in (('students', t.student, 'student_fts'), ('courses', t.course, 'course_fts')):
+        columns = [c for c in _columns(cur, table) if c != 'enrolled_count']
+        if 'enrolled_count' not in _columns(cur, table):
+            cur.execute(f'ALTER TABLE {table} ADD COLUMN enrolled_count INTEGER NOT NULL DEFAULT 0')
+        # a count going up or down is not a change to log or to re-index: those update
+        # triggers now only fire when one of the other columns is written
+        for trigger in (f'chg_{name}_update', f'{fts}_update'):
+            row = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger,)).fetchone()
+            if row is None:
+                continue
+            sql = row[0].replace(f'AFTER UPDATE ON {table}', f'AFTER UPDATE OF {", ".join(columns)} ON {table}', 1)
+            if sql == row[0]:
+                raise RuntimeError(f'unexpected definition of trigger {trigger}: {row[0]}')
+            cur.execute(f'DROP TRIGGER {trigger}')
+            cur.execute(sql)
+
+    def bump(row, by):
+        return (f'UPDATE {t.student} SET enrolled_count = enrolled_count {by} WHERE student_id = {row}.{t.e_student}; '
+                f'UPDATE {t.course} SET enrolled_count = enrolled_count {by} WHERE course_id = {row}.{t.e_course};')
+    for op, body in (('INSERT', bump('NEW', '+ 1')),
+                     ('DELETE', bump('OLD', '- 1')),
+                     (f'UPDATE OF {t.e_student}, {t.e_course}', bump('OLD', '- 1') + ' ' + bump('NEW', '+ 1'))):
+        cur.execute(f'CREATE TRIGGER IF NOT EXISTS cnt_enrollments_{op.split()[0].lower()} AFTER {op} '
+                    f'ON {t.enrollments} BEGIN {body} END')
+    recount_enrollments(cur, t)
+
+
+@migration(8, 'table_versions and enrolled_count triggers skip bulk loads, which update them once per batch')
+def _batched_bulk_loads(cur, t):
+    # what a bulk load is writing in its open transaction (the rows are never committed): the
+    # triggers of those names skip each row and the loader does their work once per batch
+    cur.execute('CREATE TABLE IF NOT EXISTS bulk_writes (name TEXT PRIMARY KEY)')
+    guarded = [(f'tv_{name}_{op}', table, name)
+               for name, table in (('students', t.student), ('courses', t.course), ('enrollments', t.enrollments))
+               for op in ('insert', 'update', 'delete')]
+    guarded += [(f'cnt_enrollments_{op}', t.enrollments, 'enrolled_count') for op in ('insert', 'update', 'delete')]
+    # the triggers of migrations 2 and 7 keep their bodies and only gain a WHEN clause (which
+    # databases built by an earlier version of this migration have already)
+    for trigger, table, name in guarded:
+        row = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger,)).fetchone()
+        if row is None or 'bulk_writes' in row[0]:
+            continue
+        sql = re.sub(rf'( ON {table})(\s)', rf"\1 WHEN NOT EXISTS (SELECT 1 FROM bulk_writes WHERE name = '{name}')\2",
+                     row[0], count=1)
+        if sql == row[0]:
+            raise RuntimeError(f'unexpected definition of trigger {trigger}: {row[0]}')
+        cur.execute(f'DROP TRIGGER {trigger}')
+        cur.execute(sql)
+
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    # transactions are managed explicitly below
+    conn.isolation_level = None
+    return conn
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def deferred(conn):
+    """Versions upgrade(defer_blocked=True) skipped, to be applied once nothing blocks them."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deferred_migrations'").fetchone():
+        return {version for (version,) in conn.execute('SELECT version FROM deferred_migrations')}
+    return set()
+
+
+def blocked_migrations(conn):
+    """[(version, description, what, rows, fix)] of the pending or deferred migrations that rows stop."""
+    cur = conn.cursor()
+    version, held = current_version(conn), deferred(conn)
+    pending = [m for m in MIGRATIONS if (m[0] > version or m[0] in held) and m[3] is not None]
+    if not pending:
+        return []
+    t = Schema(cur)
+    blocked = []
+    for number, description, _, check in pending:
+        what, rows, fix = check(cur, t)
+        if rows:
+            blocked.append((number, description, what, rows, fix))
+    return blocked
+
+
+def upgrade(path=DB_PATH, verbose=True, defer_blocked=False):
+    """Apply every pending migration, each in its own transaction. Returns the schema version.
+
+    All pending migrations are checked first: if rows stop any of them, MigrationBlocked
+    is raised before one is applied. With defer_blocked (the app starting) the blocked
+    ones are logged and skipped instead, and the next upgrade() tries them again.
+    """
+    conn = connect(path)
+    try:
+        blocked = blocked_migrations(conn)
+        if blocked and not defer_blocked:
+            raise MigrationBlocked(blocked, current_version(conn))
+        if blocked:
+            log.warning(report(blocked, current_version(conn), skipped=True))
+        skip = {b[0] for b in blocked}
+        for version, description, fn, _ in MIGRATIONS:
+            if current_version(conn) >= version and version not in deferred(conn):
+                continue
+            cur = conn.cursor()
+            # IMMEDIATE takes the write lock up front, so concurrently starting
+            # processes run a migration once and the others see the new version
+            cur.execute('BEGIN IMMEDIATE')
+            try:
+                if version in skip:
+                    if current_version(conn) < version:
+                        # the later migrations do not need it; its number is kept until it is applied
+                        cur.execute('CREATE TABLE IF NOT EXISTS deferred_migrations (version INTEGER PRIMARY KEY)')
+                        cur.execute('INSERT OR IGNORE INTO deferred_migrations (version) VALUES (?)', (version,))
+                        cur.execute(f'PRAGMA user_version = {int(version)}')
+                        if verbose:
+                            print(f'migrations: skipped {version} - {description}')
+                elif version in deferred(conn):
+                    fn(cur, Schema(cur))
+                    cur.execute('DELETE FROM deferred_migrations WHERE version = ?', (version,))
+                    if verbose:
+                        print(f'migrations: applied {version} (skipped before) - {description}')
+                elif current_version(conn) < version:
+                    fn(cur, Schema(cur))
+                    cur.execute(f'PRAGMA user_version = {int(version)}')
+                    if verbose:
+                        print(f'migrations: applied {version} - {description}')
+                cur.execute('COMMIT')
+            except Exception:
+                cur.execute('ROLLBACK')
+                raise
+        return current_version(conn)
+    finally:
+        conn.close()
+
+
+def merge_duplicates(path=DB_PATH):
+    """Merge duplicate students / courses into the oldest row of each and drop duplicate
+    enrollments, in one transaction; returns the removed rows as (table, *columns) tuples."""
+    conn = connect(path)
+    try:
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            removed = _merge_keys(cur, Schema(cur))
+            cur.execute('COMMIT')
+        except Exception:
+            cur.execute('ROLLBACK')
+            raise
+        return removed
+    finally:
+        conn.close()
+
+
+def drop_orphans(path=DB_PATH):
+    """Delete the enrollments whose student or course no longer exists, in one
+    transaction; returns them as (table, *columns) tuples."""
+    conn = connect(path)
+    try:
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            t = Schema(cur)
+            removed = [(t.enrollments,) + row for row in _orphans(cur, t)]
+            cur.execute(f'DELETE FROM {t.enrollments} WHERE {_orphaned(t)}')
+            cur.execute('COMMIT')
+        except Exception:
+            cur.execute('ROLLBACK')
+            raise
+        return removed
+    finally:
+        conn.close()
+
+
+def recount(path=DB_PATH):
+    """recount_enrollments() in its own transaction; returns how many counts were wrong."""
+    conn = connect(path)
+    try:
+        cur = conn.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            fixed = recount_enrollments(cur, Schema(cur))
+            cur.execute('COMMIT')
+        except Exception:
+            cur.execute('ROLLBACK')
+            raise
+        return fixed
+    finally:
+        conn.close()
+
+
+def hot_queries(t):
+    """(name, SQL, index that must be used) for the queries the app runs most."""
+    return [
+        ('duplicate enrollment check / withdraw',
+         f'SELECT enrollment_id FROM {t.enrollments} WHERE {t.e_student} = ? AND {t.e_course} = ?',
+         'ux_enrollments_student_course'),
+        ('student detail: enrollments of a student',
+         f'SELECT enrollment_id, {t.e_course} FROM {t.enrollments} WHERE {t.e_student} = ?',
+         'ux_enrollments_student_course'),
+        ('course detail: enrollments of a course',
+         f'SELECT enrollment_id, {t.e_student} FROM {t.enrollments} WHERE {t.e_course} = ?',
+         'ix_enrollments_course_student'),
+    ]
+
+
+def explain(path=DB_PATH):
+    """Return [(name, plan lines, uses expected index)] for hot_queries()."""
+    conn = connect(path)
+    try:
+        t = Schema(conn.cursor())
+        results = []
+        for name, sql, index in hot_queries(t):
+            params = (0,) * sql.count('?')
+            plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+            results.append((name, plan, any(index in line for line in plan)))
+        return results
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply Week 7 schema migrations.')
+    parser.add_argument('--db', default=DB_PATH, help='SQLite file (default: %(default)s)')
+    parser.add_argument('--check', action='store_true', help='verify hot queries use the indexes')
+    parser.add_argument('--recount', action='store_true', help='recompute the enrolled_count columns')
+    parser.add_argument('--merge-duplicates', action='store_true',
+                        help='merge students / courses sharing a roll number / course code and enrollments '
+                             'of a student in the same course into the oldest one')
+    parser.add_argument('--drop-orphans', action='store_true',
+                        help='delete enrollments whose student or course does not exist')
+    args = parser.parse_args()
+    if not os.path.exists(args.db):
+        raise SystemExit(f'DB not found at {args.db}')
+
+    if args.merge_duplicates:
+        removed = merge_duplicates(args.db)
+        for row in removed:
+            print('merged away', row)
+        print(f'merge-duplicates: removed {len(removed)} rows')
+    if args.drop_orphans:
+        removed = drop_orphans(args.db)
+        for row in removed:
+            print('dropped', row)
+        print(f'drop-orphans: removed {len(removed)} rows')
+    try:
+        print('schema version', upgrade(args.db))
+    except MigrationBlocked as e:
+        raise SystemExit(str(e))
+    if args.recount:
+        print(f'enrolled_count: fixed {recount(args.db)} rows')
+    if args.check:
+        failed = False
+        for name, plan, ok in explain(args.db):
+            print(f"{'ok  ' if ok else 'FAIL'} {name}")
+            for line in plan:
+                print('      ', line)
+            failed = failed or not ok
+        if failed:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Keyset (seek) pagination for the list pages.
+
+A page is requested with ``?after=<id>&limit=<n>``: rows with a primary key greater
+than ``after`` are read in key order, so every page costs the same no matter how
+deep it is. ``start`` only carries the row number of the first row on the page
+for the SNo column.
+"""
+import sys
+
+from flask import request
+from sqlalchemy import and_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+class Page:
+    def __init__(self, rows, limit, start, next_after, total):
+        self.rows = rows
+        self.limit = limit
+        self.start = start
+        self.next_after = next_after  # key of the last row shown; None on the last page
+        self.total = total
+
+    @property
+    def end(self):
+        return self.start + len(self.rows)
+
+
+def page_args(args=None):
+    """Read after / limit / start from the query string, clamping limit."""
+    if args is None:
+        args = request.args
+    after = args.get('after', type=int)
+    limit = args.get('limit', DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_LIMIT))
+    start = max(0, args.get('start', 0, type=int))
+    return after, limit, start
+
+
+def active_filters(**values):
+    """Non-empty filter values, carried over into the pager links."""
+    return {k: v for k, v in values.items() if v}
+
+
+def prefix_filter(column, prefix):
+    """column starts with prefix, written as a range so an index on column can be used."""
+    # the upper bound is prefix with its last character bumped; U+10FFFF has no successor,
+    # so trailing ones are dropped and the character before them bumped instead
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return column >= prefix
+    following = ord(stem[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        # surrogates cannot be encoded for SQLite; the next character after them is U+E000
+        following = 0xE000
+    return and_(column >= prefix, column < stem[:-1] + chr(following))
+
+
+def keyset_select(stmt, key, after, limit):
+    """stmt restricted to the page after the given key value; stmt must select key itself."""
+    if after is not None:
+        stmt = stmt.where(key > after)
+    # one extra row tells whether there is a next page
+    return stmt.order_by(key).limit(limit + 1)
+
+
+def make_page(rows, key, after, limit, start, total):
+    """Page from the rows of keyset_select()."""
+    if after is None:
+        start = 0
+    next_after = getattr(rows[limit - 1], key.key) if len(rows) > limit else None
+    return Page(rows[:limit], limit, start, next_after, total)
+
+
+def keyset_page(session, stmt, key, after, limit, start, total):
+    """Run stmt for the page after the given key value; stmt must select key itself."""
+    rows = session.execute(keyset_select(stmt, key, after, limit)).all()
+    return make_page(rows, key, after, limit, start, total)
@@ -0,0 +1,110 @@
+"""Full-text search over students and courses (FTS5 indexes from migration 4).
+
+``student_fts`` indexes roll number, first and last name and ``course_fts``
+course code, name and description. Both are external-content tables: triggers
+add and remove index entries as rows change, and reading a column from them
+reads the row of Student / Course. Every word of a query is matched as a prefix
+("ali cl" finds "Alice Clark"), which the prefix indexes answer without a scan,
+so the results can back a typeahead.
+
+Results are ordered by relevance (FTS5's bm25 ``rank``) when fewer than
+``RANK_CANDIDATES`` rows match. Ranking has to score every match, which takes
+seconds for a one-letter prefix over a million students, so broader queries
+return their first matches in id order instead.
+
+    python search.py "ali cl"       run a query against the database
+    python search.py --rebuild      rebuild both indexes from the tables
+"""
+import re
+import time
+import sqlite3
+import argparse
+
+from sqlalchemy import text
+
+from init_db import DB_PATH
+from migrations import FTS_TABLES
+
+LIMIT = 10
+MAX_LIMIT = 50
+RANK_CANDIDATES = 1000
+
+# what a hit is called in results -> (FTS table, result keys: rowid first, then its columns)
+KINDS = {
+    'students': ('student_fts', ('student_id', 'roll_number', 'first_name', 'last_name')),
+    'courses': ('course_fts', ('course_id', 'course_code', 'course_name', 'course_description')),
+}
+
+
+def match_expr(q):
+    """FTS5 query matching every word of q as a prefix, or None when q has no words."""
+    words = re.findall(r'\w+', q)
+    if not words:
+        return None
+    # quoted, so words like AND / NOT or a '-' in the input are never read as query syntax
+    return ' '.join(f'"{w}"*' for w in words)
+
+
+def find(execute, kind, expr, limit):
+    """Rows of kind matching the FTS5 expression; execute(sql, params) runs a query and returns its rows."""
+    fts, keys = KINDS[kind]
+    columns = ', '.join(('rowid',) + keys[1:])
+    # counting up to RANK_CANDIDATES ids stops early however many rows match
+    matches = len(execute(f'SELECT rowid FROM {fts} WHERE {fts} MATCH :q LIMIT {RANK_CANDIDATES}', {'q': expr}))
+    order = 'ORDER BY rank ' if matches < RANK_CANDIDATES else ''
+    rows = execute(f'SELECT {columns} FROM {fts} WHERE {fts} MATCH :q {order}LIMIT {int(limit)}', {'q': expr})
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def search(session, q, kinds=tuple(KINDS), limit=LIMIT):
+    """{kind: [row dicts]} of the best matches for q, at most limit per kind."""
+    expr = match_expr(q)
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    def execute(sql, params):
+        return session.execute(text(sql), params).all()
+    return {kind: find(execute, kind, expr, limit) if expr else [] for kind in kinds}
+
+
+def rebuild(path=DB_PATH):
+    """Rebuild the FTS indexes from the Student and Course tables; returns the seconds taken."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            for fts in FTS_TABLES:
+                conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+                conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('optimize')")
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search or rebuild the Week 7 full-text indexes.')
+    parser.add_argument('query', nargs='?', help='words to look up (each matched as a prefix)')
+    parser.add_argument('--db', default=DB_PATH, help='SQLite file (default: %(default)s)')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the indexes from the tables')
+    parser.add_argument('--limit', type=int, default=LIMIT)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        print(f'rebuilt {", ".join(FTS_TABLES)} in {rebuild(args.db):.2f}s')
+    if args.query:
+        expr = match_expr(args.query)
+        conn = sqlite3.connect(args.db)
+        try:
+            for kind in KINDS:
+                started = time.perf_counter()
+                rows = find(lambda sql, params: conn.execute(sql, params).fetchall(), kind, expr, args.limit) if expr else []
+                print(f'{kind}: {len(rows)} in {(time.perf_counter() - started) * 1000:.1f} ms')
+                for row in rows:
+                    print('   ', row)
+        finally:
+            conn.close()
+    if not (args.rebuild or args.query):
+        parser.error('give a query or --rebuild')
+
+
+if __name__ == '__main__':
+    main()
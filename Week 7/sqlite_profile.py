@@ -0,0 +1,79 @@
+"""SQLite connection tuning for the Week 7 app.
+
+Every new DBAPI connection the engine opens gets the PRAGMAs of the selected
+profile through an engine ``connect`` event:
+
+- ``tuned`` (default): WAL journal so readers never wait for a writer, fsync only
+  at checkpoints (synchronous=NORMAL), a memory-mapped read path, a larger page
+  cache, a busy timeout instead of immediate "database is locked" errors,
+  foreign key enforcement and in-memory temp tables.
+- ``default``: leave SQLite's own defaults alone (rollback journal), for comparison.
+
+Whatever the profile, foreign keys are enforced: deleting a student or course
+relies on ``ON DELETE CASCADE`` to remove its enrollments (migration 5), so
+that pragma is about correctness, not speed, and cannot be overridden.
+
+Pick one with ``app.config["SQLITE_PROFILE"]`` or the ``WEEK7_SQLITE_PROFILE``
+environment variable, and override single values with ``app.config["SQLITE_PRAGMAS"]``.
+"""
+import os
+
+from sqlalchemy import event
+
+PROFILES = {
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative means KiB, so 64 MiB
+        'busy_timeout': 5000,  # ms
+        'temp_store': 'MEMORY',
+    },
+    'default': {},
+}
+
+# set on every connection, after the profile and any overrides
+REQUIRED = {
+    'foreign_keys': 'ON',
+}
+
+# connection pool for the engine; SQLite allows one writer at a time, so a
+# handful of connections per process is plenty and bounds open file handles
+ENGINE_OPTIONS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+}
+
+
+def pragmas_for(profile, overrides=None):
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown SQLite profile {profile!r}, expected one of {sorted(PROFILES)}")
+    return {**PROFILES[profile], **(overrides or {}), **REQUIRED}
+
+
+def apply_pragmas(dbapi_conn, pragmas):
+    cur = dbapi_conn.cursor()
+    for name, value in pragmas.items():
+        cur.execute(f'PRAGMA {name} = {value}')
+    cur.close()
+
+
+def listen(engine, pragmas):
+    """Apply pragmas to every connection engine opens from now on."""
+    if pragmas:
+        event.listen(engine, 'connect', lambda conn, record: apply_pragmas(conn, pragmas))
+
+
+def configure(app):
+    """Fill in engine options before Flask-SQLAlchemy creates the engine."""
+    app.config.setdefault('SQLITE_PROFILE', os.environ.get('WEEK7_SQLITE_PROFILE', 'tuned'))
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    for key, value in ENGINE_OPTIONS.items():
+        options.setdefault(key, value)
+
+
+def init_app(app, db):
+    pragmas = pragmas_for(app.config['SQLITE_PROFILE'], app.config.get('SQLITE_PRAGMAS'))
+    with app.app_context():
+        listen(db.engine, pragmas)
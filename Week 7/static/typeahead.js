@@ -0,0 +1,26 @@
+// Fills a <select> with the options matching what is typed into the search box
+// above it (data-options: JSON endpoint, data-select: id of the select).
+document.querySelectorAll('input[data-options]').forEach(function (input) {
+  var select = document.getElementById(input.dataset.select);
+  var timer = null;
+  var latest = 0;
+
+  function load() {
+    var request = ++latest;
+    fetch(input.dataset.options + '?q=' + encodeURIComponent(input.value.trim()))
+      .then(function (r) { return r.json(); })
+      .then(function (rows) {
+        // an answer to an older query arriving late must not replace a newer one
+        if (request !== latest) return;
+        select.innerHTML = '';
+        rows.forEach(function (row) {
+          select.appendChild(new Option(row.label, row.id));
+        });
+      });
+  }
+
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    timer = setTimeout(load, 150);
+  });
+});
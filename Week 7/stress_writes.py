@@ -0,0 +1,145 @@
+"""Concurrent-writer stress test of the create student / enroll write paths.
+
+Worker processes (like gunicorn workers) create students and enroll each of
+them in the same course, against a scratch copy of the database. With
+``shared`` keys all workers try to create the same students and enrollments,
+in a different order each, so most attempts are duplicates and some race; with
+``own`` keys every worker writes rows no other worker touches. Two write paths
+are compared:
+
+- ``check``: SELECT for an existing row, then INSERT, as the routes did before
+  (a second worker can pass the check before the first one commits; the unique
+  indexes of migration 6 then reject its INSERT, which the old routes turned
+  into a 500, and without them it would have been a duplicate row);
+- ``upsert``: insert_new() as the routes now use it, one ``INSERT ... ON
+  CONFLICT DO NOTHING RETURNING`` per write.
+
+Both run inside an app context without the request around them, so the
+numbers compare the write paths only.
+
+Each key must end up created exactly once. Reports attempts/sec, how many
+attempts created a row, were reported as duplicates, or failed, and the
+duplicate rows found in the tables afterwards:
+
+    python stress_writes.py --workers 4 --keys 2000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import multiprocessing
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def roll_number(method, shared, worker, i):
+    # e.g. "CS-000042" (check, shared) or "UO3-000042" (upsert, own keys of worker 3)
+    return f"{method[0].upper()}{'S' if shared else 'O'}{'' if shared else worker}-{i:06d}"
+
+
+def worker(method, path, keys, cid, shared, seed, out):
+    os.environ['WEEK7_DB_PATH'] = path
+    sys.path.insert(0, BASE_DIR)
+    from sqlalchemy.exc import IntegrityError
+    from app import app, db, insert_new, Student, Enrollment
+
+    order = list(range(keys))
+    random.Random(seed).shuffle(order)
+    counts = {'created': 0, 'duplicate': 0, 'failed': 0}
+
+    def check_then_insert(model, exists, **values):
+        with app.app_context():
+            if db.session.execute(db.select(model).filter_by(**exists)).first():
+                return 'duplicate'
+            db.session.add(model(**values))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                return 'failed'
+            return 'created'
+
+    def upsert(model, key, **values):
+        with app.app_context():
+            new_id = insert_new(model, key, **values)
+            db.session.commit()
+            return 'duplicate' if new_id is None else 'created'
+
+    started = time.perf_counter()
+    for i in order:
+        roll = roll_number(method, shared, seed, i)
+        if method == 'check':
+            outcome = check_then_insert(Student, {'roll_number': roll}, roll_number=roll, first_name='Stress')
+        else:
+            outcome = upsert(Student, [Student.roll_number], roll_number=roll, first_name='Stress')
+        counts[outcome] += 1
+    for i in order:
+        roll = roll_number(method, shared, seed, i)
+        with app.app_context():
+            sid = db.session.scalar(db.select(Student.student_id).filter_by(roll_number=roll))
+        if method == 'check':
+            outcome = check_then_insert(Enrollment, {'student_id': sid, 'course_id': cid}, student_id=sid, course_id=cid)
+        else:
+            outcome = upsert(Enrollment, [Enrollment.student_id, Enrollment.course_id], student_id=sid, course_id=cid)
+        counts[outcome] += 1
+    out.put((time.perf_counter() - started, counts))
+
+
+def run(method, path, workers, keys, cid, shared):
+    out = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(method, path, keys, cid, shared, i, out))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    counts = {'created': 0, 'duplicate': 0, 'failed': 0}
+    for _, c in results:
+        for k, v in c.items():
+            counts[k] += v
+    prefix = roll_number(method, shared, 0, 0)[:2] + '%'
+    conn = sqlite3.connect(path)
+    extra_students = conn.execute('SELECT COUNT(*) - COUNT(DISTINCT roll_number) FROM Student WHERE roll_number LIKE ?',
+                                  (prefix,)).fetchone()[0]
+    extra_enrollments = conn.execute('''SELECT COUNT(*) - COUNT(DISTINCT e.estudent_id) FROM enrollments e
+                                        JOIN Student s ON s.student_id = e.estudent_id
+                                        WHERE e.ecourse_id = ? AND s.roll_number LIKE ?''', (cid, prefix)).fetchone()[0]
+    conn.close()
+    attempts = sum(counts.values())
+    return dict(counts, ops_per_sec=attempts / max(t for t, _ in results), extra_rows=extra_students + extra_enrollments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Race create_student / add_enrollment from several processes.')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--keys', type=int, default=2000, help='students (and enrollments) each worker tries to create')
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    path = os.path.join(work, 'stress.sqlite3')
+    shutil.copy(os.path.join(BASE_DIR, 'week7_database.sqlite3'), path)
+    try:
+        sys.path.insert(0, BASE_DIR)
+        import migrations
+        migrations.upgrade(path, verbose=False)
+        conn = sqlite3.connect(path)
+        cid = conn.execute('SELECT MIN(course_id) FROM Course').fetchone()[0]
+        conn.close()
+
+        print(f'{args.workers} workers, {args.keys} students + {args.keys} enrollments each, course {cid}')
+        print(f"{'keys':<7} {'method':<7} {'ops/s':>7} {'created':>8} {'duplicate':>10} {'failed':>7} {'extra rows':>11}")
+        for keys in ('shared', 'own'):
+            for method in ('check', 'upsert'):
+                r = run(method, path, args.workers, args.keys, cid, keys == 'shared')
+                print(f"{keys:<7} {method:<7} {r['ops_per_sec']:>7.0f} {r['created']:>8} {r['duplicate']:>10} {r['failed']:>7} {r['extra_rows']:>11}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
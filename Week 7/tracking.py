@@ -0,0 +1,122 @@
+"""Bookkeeping of committed writes, used to keep in-process caches honest.
+
+Session events record which tables and which rows ("entities", e.g.
+``('Student', 4)``) a transaction touched. ORM objects are picked up
+automatically in ``after_flush``; a model names the entities it affects through
+a ``changed_entities()`` method. Core statements call ``note_change``. Once the
+transaction commits, the version of every touched table is bumped, cached counts
+that depend on those tables are dropped and subscribers (such as the detail page
+cache) are told what changed. A rollback discards the record.
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+
+# cached counts kept at most; keys include client-supplied filter prefixes
+MAX_COUNTS = 1024
+
+_lock = threading.Lock()
+_versions = {}  # table name -> number of committed transactions that changed it
+_counts = OrderedDict()  # cache key -> (tables it depends on, value), least recently used first
+_subscribers = []
+
+_PENDING = 'tracking_pending'
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING, (set(), set()))
+
+
+def note_change(session, *tables, entities=()):
+    """Record tables (and optionally entities) written through Core statements in the current transaction."""
+    changed_tables, changed_entities = _pending(session)
+    changed_tables.update(tables)
+    changed_entities.update(entities)
+
+
+def _after_flush(session, flush_context):
+    changed_tables, changed_entities = _pending(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None:
+            changed_tables.add(table.name)
+        entities = getattr(obj, 'changed_entities', None)
+        if entities is not None:
+            changed_entities.update(entities())
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending and (pending[0] or pending[1]):
+        changed(*pending)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def subscribe(callback):
+    """Call callback(tables, entities) after every commit that changed something."""
+    _subscribers.append(callback)
+
+
+def changed(tables, entities=()):
+    """Bump versions, drop cached counts and notify subscribers about committed changes."""
+    tables = set(tables)
+    with _lock:
+        for t in tables:
+            _versions[t] = _versions.get(t, 0) + 1
+        for key in [k for k, (deps, _) in _counts.items() if deps & tables]:
+            del _counts[key]
+    for callback in _subscribers:
+        callback(tables, set(entities))
+
+
+def version(*tables):
+    """Combined change counter of the given tables (changes whenever any of them does)."""
+    with _lock:
+        return tuple(_versions.get(t, 0) for t in tables)
+
+
+def count_token(tables):
+    """Token to pass to store_count(); taken before computing the count."""
+    return version(*sorted(tables))
+
+
+def peek_count(key):
+    """Cached count stored under key, or None."""
+    with _lock:
+        hit = _counts.get(key)
+        if hit is None:
+            return None
+        _counts.move_to_end(key)
+    return hit[1]
+
+
+def store_count(key, tables, value, token):
+    """Cache value under key, unless one of tables changed since count_token() gave token."""
+    with _lock:
+        # a commit that landed while the count ran may not be in value
+        if tuple(_versions.get(t, 0) for t in sorted(tables)) != token:
+            return
+        _counts[key] = (frozenset(tables), value)
+        _counts.move_to_end(key)
+        while len(_counts) > MAX_COUNTS:
+            _counts.popitem(last=False)
+
+
+def cached_count(key, tables, compute):
+    """Return compute() cached under key until one of tables changes."""
+    value = peek_count(key)
+    if value is None:
+        token = count_token(tables)
+        value = compute()
+        store_count(key, tables, value, token)
+    return value
+
+
+def init_app(db):
+    event.listen(db.session, 'after_flush', _after_flush)
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_rollback', _after_rollback)
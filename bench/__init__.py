@@ -0,0 +1,22 @@
+"""Benchmarks for the Week 3, Week 4 and Week 7 apps.
+
+    python -m bench generate --students 5000 --courses 200 --per-student 8 --out /tmp/benchdata
+    python -m bench run                     micro-benchmarks, saved to bench/results/<commit>.json
+    python -m bench run --load              also load the Week 4 / Week 7 servers over HTTP
+    python -m bench compare A.json B.json   per-benchmark change, non-zero exit on regressions
+    python -m bench importtime              fail if an app imports too slowly or loads matplotlib
+
+Every week's app is a module called ``app`` that expects to be run from its own
+folder, so each week is benchmarked in a separate subprocess (``bench.micro``).
+The apps are pointed at the synthetic data through environment variables, so the
+data files in the repository are never touched.
+"""
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEEKS = {
+    'week3': os.path.join(ROOT, 'Week 3'),
+    'week4': os.path.join(ROOT, 'Week 4'),
+    'week7': os.path.join(ROOT, 'Week 7'),
+}
+RESULTS_DIR = os.path.join(ROOT, 'bench', 'results')
@@ -0,0 +1,113 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from bench import ROOT, WEEKS, data, load, results, importtime
+
+
+def add_data_args(parser):
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--courses', type=int, default=100)
+    parser.add_argument('--per-student', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def cmd_generate(args):
+    info = data.generate(args.out, args.students, args.courses, args.per_student, args.seed)
+    print(f'wrote data.csv and week7.sqlite3 to {args.out}: {info}')
+
+
+def run_micro(week, data_dir, repeat):
+    out = subprocess.run([sys.executable, '-m', 'bench.micro', week, data_dir, '--repeat', str(repeat)],
+                         cwd=ROOT, stdout=subprocess.PIPE, check=True)
+    return json.loads(out.stdout)
+
+
+def cmd_run(args):
+    data_dir = args.data
+    scratch = None
+    if data_dir is None:
+        scratch = data_dir = tempfile.mkdtemp(prefix='bench_data_')
+        info = data.generate(data_dir, args.students, args.courses, args.per_student, args.seed)
+    else:
+        info = {'data': os.path.abspath(data_dir)}
+    try:
+        found = {}
+        for week in args.weeks:
+            print(f'{week}: micro-benchmarks ...', file=sys.stderr)
+            found.update(run_micro(week, data_dir, args.repeat))
+            if args.load and week != 'week3':
+                print(f'{week}: HTTP load for {args.seconds}s ...', file=sys.stderr)
+                found.update(load.run(week, data_dir, args.concurrency, args.processes, args.seconds))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    params = dict(info, repeat=args.repeat, load=args.load)
+    path = results.save(found, params, args.out)
+    for name, r in sorted(found.items()):
+        if 'median_ms' in r:
+            size = f"  {r['bytes']:>8} bytes" if 'bytes' in r else ''
+            print(f"{name:<50} {r['median_ms']:>10.3f} ms median  {r['p95_ms']:>10.3f} ms p95{size}")
+        else:
+            print(f"{name:<50} {r['rps']:>10.0f} req/s   {r['p99_ms']:>10.3f} ms p99  {r['errors']} errors")
+    print(f'saved {path}')
+
+
+def cmd_compare(args):
+    old, new = results.load(args.old), results.load(args.new)
+    print(f"{old['commit']} -> {new['commit']}")
+    regressed = False
+    for name, metric, a, b, change, worse in results.compare(old, new, args.threshold):
+        regressed = regressed or worse
+        print(f"{'REGRESSED' if worse else '':<9} {name:<50} {metric:<10} {a:>10.3f} -> {b:>10.3f} {change:>+7.1f}%")
+    if regressed:
+        raise SystemExit(1)
+
+
+def cmd_importtime(args):
+    importtime.main(args.repeat, args.weeks)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Benchmarks for the Week 3/4/7 apps.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('generate', help='write synthetic data.csv and week7.sqlite3')
+    p.add_argument('--out', required=True)
+    add_data_args(p)
+    p.set_defaults(fn=cmd_generate)
+
+    p = sub.add_parser('run', help='run the benchmarks and save the results as JSON')
+    p.add_argument('--data', help='folder from "generate" (default: generate into a temporary folder)')
+    add_data_args(p)
+    p.add_argument('--weeks', nargs='+', choices=sorted(WEEKS), default=sorted(WEEKS))
+    p.add_argument('--repeat', type=int, default=20)
+    p.add_argument('--load', action='store_true', help='also run the concurrent HTTP load against Week 4 and 7')
+    p.add_argument('--concurrency', type=int, default=16)
+    p.add_argument('--processes', type=int, default=2)
+    p.add_argument('--seconds', type=float, default=5)
+    p.add_argument('--out', help='result file (default: bench/results/<commit>.json)')
+    p.set_defaults(fn=cmd_run)
+
+    p = sub.add_parser('compare', help='compare two result files')
+    p.add_argument('old')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=10.0, help='percent slower that counts as a regression')
+    p.set_defaults(fn=cmd_compare)
+
+    p = sub.add_parser('importtime', help='check the import time of every app against its budget')
+    p.add_argument('--weeks', nargs='+', choices=sorted(WEEKS), default=sorted(WEEKS))
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(fn=cmd_importtime)
+
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == '__main__':
+    main()
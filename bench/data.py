@@ -0,0 +1,69 @@
+"""Synthetic data: N students x M courses with K enrollments / marks per student.
+
+Writes into one folder:
+
+- ``data.csv`` in the Week 3 / Week 4 format (``Student id, Course id, Marks``),
+  student ids from 1001 and course ids from 2001;
+- ``week7.sqlite3``: the schema and sample rows from Week 7's ``init_db.py``
+  (including its migrations), plus the synthetic students, courses and
+  enrollments. Student k is roll number ``S<k>`` and course k code ``C<k>``.
+"""
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+
+from bench import WEEKS
+
+STUDENT_BASE = 1001
+COURSE_BASE = 2001
+
+
+def write_csv(path, students, courses, per_student, rng):
+    per_student = min(per_student, courses)
+    with open(path, 'w') as f:
+        f.write('Student id, Course id, Marks\n')
+        for s in range(students):
+            for c in sorted(rng.sample(range(courses), per_student)):
+                f.write(f'{STUDENT_BASE + s}, {COURSE_BASE + c}, {rng.randint(0, 100)}\n')
+
+
+def write_db(path, students, courses, per_student, rng):
+    if os.path.exists(path):
+        os.remove(path)
+    # the schema comes from init_db.py itself; it reads WEEK7_DB_PATH when imported
+    env = dict(os.environ, WEEK7_DB_PATH=path)
+    subprocess.run([sys.executable, '-c', 'import init_db; init_db.init_db()'], cwd=WEEKS['week7'], env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+
+    sys.path.insert(0, WEEKS['week7'])
+    try:
+        from init_db import list_tables, find_table, enrollment_columns
+    finally:
+        sys.path.pop(0)
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    tables = list_tables(cur)
+    student, course, enrollments = (find_table(tables, n) for n in ('student', 'course', 'enrollments'))
+    s_col, c_col = enrollment_columns(cur, enrollments)
+    cur.executemany(f'INSERT INTO {student} (roll_number, first_name, last_name) VALUES (?, ?, ?)',
+                    ((f'S{k:07d}', f'First{k}', f'Last{k}') for k in range(students)))
+    cur.executemany(f'INSERT INTO {course} (course_code, course_name, course_description) VALUES (?, ?, ?)',
+                    ((f'C{k:05d}', f'Course {k}', f'Synthetic course {k}') for k in range(courses)))
+    sids = [r[0] for r in cur.execute(f"SELECT student_id FROM {student} WHERE roll_number LIKE 'S%' ORDER BY student_id")]
+    cids = [r[0] for r in cur.execute(f"SELECT course_id FROM {course} WHERE course_code LIKE 'C%' ORDER BY course_id")]
+    per_student = min(per_student, courses)
+    cur.executemany(f'INSERT INTO {enrollments} ({s_col}, {c_col}) VALUES (?, ?)',
+                    ((sid, cid) for sid in sids for cid in rng.sample(cids, per_student)))
+    con.commit()
+    con.close()
+
+
+def generate(out_dir, students=1000, courses=50, per_student=5, seed=1):
+    """Write data.csv and week7.sqlite3 into out_dir; returns a dict describing the data."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    write_csv(os.path.join(out_dir, 'data.csv'), students, courses, per_student, rng)
+    write_db(os.path.join(out_dir, 'week7.sqlite3'), students, courses, per_student, rng)
+    return {'students': students, 'courses': courses, 'per_student': per_student, 'seed': seed}
@@ -0,0 +1,80 @@
+"""Import-time budget of each week's app.
+
+    python -m bench importtime
+
+Imports every week's ``app`` module in a fresh interpreter under
+``python -X importtime`` and fails when the import takes longer than the week's
+budget or pulls in a module that must stay lazy (matplotlib is only loaded when
+a chart is drawn). The fastest of --repeat runs is compared, so one slow start
+on a busy machine does not fail the check.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+from bench import WEEKS
+
+# milliseconds for "import app", with room for slower machines
+BUDGET_MS = {'week3': 400, 'week4': 600, 'week7': 1000}
+FORBIDDEN = ('matplotlib',)
+
+
+def parse(stderr):
+    """({module: cumulative us}, cumulative us of app) from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit():
+            modules[name.strip()] = int(cumulative)
+    return modules, modules.get('app', 0)
+
+
+def measure(week, work):
+    env = dict(os.environ)
+    # keep the apps away from the repository's data files
+    if week == 'week4':
+        env['WEEK4_CHARTS_DIR'] = os.path.join(work, 'charts')
+    elif week == 'week7':
+        db = os.path.join(work, 'week7.sqlite3')
+        if not os.path.exists(db):
+            shutil.copy(os.path.join(WEEKS['week7'], 'week7_database.sqlite3'), db)
+        env['WEEK7_DB_PATH'] = db
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=WEEKS[week], env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    return parse(out.stderr)
+
+
+def check(repeat=3, weeks=None):
+    """[(week, ms, budget ms, forbidden modules imported)]; the import of each week measured repeat times."""
+    rows = []
+    work = tempfile.mkdtemp(prefix='bench_importtime_')
+    try:
+        for week in weeks or sorted(WEEKS):
+            best, forbidden = None, set()
+            for _ in range(repeat):
+                modules, total = measure(week, work)
+                best = total if best is None else min(best, total)
+                forbidden |= {m for m in modules if m.split('.')[0] in FORBIDDEN}
+            rows.append((week, best / 1000, BUDGET_MS[week], sorted(forbidden)))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return rows
+
+
+def main(repeat=3, weeks=None):
+    failed = False
+    for week, ms, budget, forbidden in check(repeat, weeks):
+        ok = ms <= budget and not forbidden
+        failed = failed or not ok
+        note = f' imports {", ".join(forbidden[:3])}' if forbidden else ''
+        print(f"{'ok  ' if ok else 'FAIL'} {week}: import app {ms:.0f} ms (budget {budget} ms){note}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Concurrent HTTP load against the Week 4 and Week 7 apps.
+
+Starts ``bench.serve`` for a week on a free port (or uses --url for a server
+you started yourself) and drives it with the client of ``Week 7/loadtest.py``.
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import sqlite3
+import subprocess
+
+from bench import ROOT, WEEKS
+from bench.data import STUDENT_BASE, COURSE_BASE
+
+sys.path.insert(0, WEEKS['week7'])
+import loadtest  # noqa: E402  (lives in Week 7, next to the app it was written for)
+sys.path.pop(0)
+
+
+def paths_for(week, data_dir):
+    if week == 'week4':
+        return ['/', f'/student?s={STUDENT_BASE}', f'/course?c={COURSE_BASE}']
+    con = sqlite3.connect(os.path.join(data_dir, 'week7.sqlite3'))
+    try:
+        sid = con.execute("SELECT student_id FROM Student WHERE roll_number = 'S0000000'").fetchone()[0]
+        cid = con.execute("SELECT course_id FROM Course WHERE course_code = 'C00000'").fetchone()[0]
+    finally:
+        con.close()
+    return ['/students', '/courses', '/enrollments', f'/student/{sid}', f'/course/{cid}', '/api/v1/courses']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start within {timeout}s')
+
+
+def run(week, data_dir, concurrency=16, processes=2, seconds=5, url=None):
+    """{'week7.http': {...}} with requests/sec, p50 / p99 latency and errors."""
+    server = None
+    if url is None:
+        port = free_port()
+        server = subprocess.Popen([sys.executable, '-m', 'bench.serve', week, data_dir, str(port)], cwd=ROOT,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url = f'http://127.0.0.1:{port}'
+    try:
+        if server is not None:
+            wait_for(port)
+        rps, p50, p99, errors = loadtest.run(url, paths_for(week, data_dir), concurrency, processes, seconds)
+    finally:
+        if server is not None:
+            # SIGINT lets the server remove its scratch copy
+            server.send_signal(signal.SIGINT)
+            server.wait()
+    return {f'{week}.http': {'rps': rps, 'p50_ms': p50, 'p99_ms': p99, 'errors': errors,
+                             'concurrency': concurrency, 'seconds': seconds}}
@@ -0,0 +1,251 @@
+"""Micro-benchmarks of one week's app, run in a process of its own.
+
+    python -m bench.micro week4 DATA_DIR [--repeat N]
+
+Prints {benchmark name: timing stats} as JSON on stdout. DATA_DIR is a folder
+written by bench.data.generate(); the app under test only ever sees copies in a
+scratch folder.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from bench import WEEKS
+from bench.data import STUDENT_BASE, COURSE_BASE
+
+
+def stats(samples):
+    samples = sorted(samples)
+    return {
+        'n': len(samples),
+        'min_ms': samples[0] * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+    }
+
+
+def timed(fn, repeat, warmup=1, setup=None):
+    """Stats of repeat calls of fn (after warmup calls); setup() runs untimed before each call."""
+    samples = []
+    for i in range(warmup + repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        if i >= warmup:
+            samples.append(elapsed)
+    return stats(samples)
+
+
+def get(client, path):
+    """Test-client GET that fails loudly instead of timing an error page."""
+    def call():
+        r = client.get(path)
+        r.close()
+        if r.status_code >= 400:
+            raise RuntimeError(f'{path} -> {r.status_code}')
+    return call
+
+
+def use_week(week):
+    sys.path.insert(0, WEEKS[week])
+
+
+def week3(data_dir, work, repeat):
+    # Week 3 reads data.csv from the current directory
+    shutil.copy(os.path.join(data_dir, 'data.csv'), work)
+    os.chdir(work)
+    use_week('week3')
+    import app
+
+    students, courses = app.read_groups('data.csv')
+    sid, cid = STUDENT_BASE, COURSE_BASE
+    results = {
+        'week3.read_groups.all': timed(lambda: app.read_groups('data.csv'), repeat),
+        'week3.read_groups.one_student': timed(lambda: app.read_groups('data.csv', {sid}, set()), repeat),
+        'week3.read_groups.one_course': timed(lambda: app.read_groups('data.csv', set(), {cid}), repeat),
+        'week3.student_page': timed(lambda: ''.join(app.student_page(students[sid])), repeat),
+        'week3.course_page': timed(lambda: ''.join(app.course_page(cid, courses[cid])), repeat),
+        'week3.draw_chart': timed(lambda: app.draw_chart(cid, courses[cid], os.path.join(work, 'chart.png')), repeat),
+    }
+
+    # the CLI branches as a user runs them, interpreter start-up included
+    script = os.path.join(WEEKS['week3'], 'app.py')
+    branches = {
+        'student': ['-s', str(sid)],
+        'course': ['-c', str(cid)],
+        'course.svg': ['-c', str(cid), '--chart', 'svg'],
+        'course.data': ['-c', str(cid), '--chart', 'data'],
+        'unknown_id': ['-s', '1'],
+        'no_args': [],
+        'all_courses': ['--all-courses', '--out-dir', 'reports'],
+        'all_students': ['--all-students', '--out-dir', 'reports'],
+    }
+    for name, argv in branches.items():
+        results[f'week3.cli.{name}'] = timed(
+            lambda argv=argv: subprocess.run([sys.executable, script] + argv, check=True, stdout=subprocess.DEVNULL), max(1, min(repeat, 3)))
+    return results
+
+
+def week4(data_dir, work, repeat):
+    data_file = os.path.join(work, 'data.csv')
+    shutil.copy(os.path.join(data_dir, 'data.csv'), data_file)
+    charts_dir = os.path.join(work, 'charts')
+    os.environ['WEEK4_DATA_FILE'] = data_file
+    os.environ['WEEK4_CHARTS_DIR'] = charts_dir
+    use_week('week4')
+    import app
+    from marks_store import MarksStore
+    from chart_cache import chart_key
+    import chart_render
+
+    sidecar = data_file + '.bin'
+    client = app.app.test_client()
+    sid, cid = STUDENT_BASE, COURSE_BASE
+
+    def drop_sidecar():
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+
+    def drop_charts():
+        # the cache notices missing files and draws the chart again; a job still running
+        # from the last sample would make the next request only join it, so wait for it
+        wait_chart()
+        for name in os.listdir(charts_dir):
+            os.remove(os.path.join(charts_dir, name))
+
+    def wait_chart():
+        # the page only starts the chart; the timed request should find it drawn
+        app.chart_jobs.wait(chart_key(cid, app.snapshot().course_summary(cid).hist))
+
+    def new_chart():
+        # from the page request until the background worker's chart is in the cache
+        client.get(f'/course?c={cid}').close()
+        wait_chart()
+
+    def first_view(mode):
+        # a course page in one chart mode plus the image it links to, as a browser would fetch them
+        r = client.get(f'/course?c={cid}&chart={mode}')
+        served = len(r.data)
+        img = re.search(rb'<img src="([^"]+)"', r.data)
+        if img:
+            served += len(client.get(img.group(1).decode()).data)
+        return served
+
+    results = {
+        'week4.load.parse_csv': timed(lambda: MarksStore(data_file).snapshot(), repeat, setup=drop_sidecar),
+        'week4.load.sidecar': timed(lambda: MarksStore(data_file).snapshot(), repeat),
+        'week4.read_data': timed(app.read_data, repeat),
+        'week4.route.student': timed(get(client, f'/student?s={sid}'), repeat),
+        'week4.route.course.cached_chart': timed(get(client, f'/course?c={cid}'), repeat, setup=wait_chart),
+        # the page only queues a new chart, background_render below includes the drawing
+        'week4.route.course.new_chart_enqueue': timed(get(client, f'/course?c={cid}'), repeat, setup=drop_charts),
+        'week4.chart.background_render': timed(new_chart, repeat, setup=drop_charts),
+        'week4.route.index': timed(get(client, '/'), repeat),
+    }
+
+    # chart modes: drawing time (inline, so it is inside the request) and bytes sent for a new chart;
+    # static/bar_chart.js of the "data" mode is cached by the browser after the first page, so it is listed apart
+    app.chart_jobs.workers = 0
+    for mode in chart_render.MODES:
+        results[f'week4.chart_mode.{mode}'] = dict(timed(lambda: first_view(mode), repeat, setup=drop_charts),
+                                                    bytes=first_view(mode))
+    results['week4.chart_mode.data']['script_bytes'] = len(client.get('/static/bar_chart.js').data)
+    return results
+
+
+def week7(data_dir, work, repeat):
+    db_path = os.path.join(work, 'week7.sqlite3')
+    shutil.copy(os.path.join(data_dir, 'week7.sqlite3'), db_path)
+    os.environ['WEEK7_DB_PATH'] = db_path
+    use_week('week7')
+    import app
+
+    client = app.app.test_client()
+    with app.app.app_context():
+        sid = app.db.session.scalar(app.select(app.Student.student_id).where(app.Student.roll_number == 'S0000000'))
+        cid = app.db.session.scalar(app.select(app.Course.course_id).where(app.Course.course_code == 'C00000'))
+        eid = app.db.session.scalar(app.select(app.Enrollment.enrollment_id).where(app.Enrollment.student_id == sid))
+    args = {'sid': sid, 'student_id': sid, 'cid': cid, 'course_id': cid, 'enid': eid,
+            'enrollment_id': eid}
+
+    results = {}
+    # every GET route that only reads; the ones that delete or withdraw are skipped
+    for rule in sorted(app.app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.endpoint == 'static':
+            continue
+        if 'delete' in rule.endpoint or 'withdraw' in rule.endpoint:
+            continue
+        if rule.endpoint == 'api_options':
+            # takes a kind, timed below
+            continue
+        path = rule.rule
+        for name in rule.arguments:
+            path = path.replace(f'<int:{name}>', str(args[name]))
+        results[f'week7.route.{rule.endpoint}'] = timed(get(client, path), repeat)
+        if rule.endpoint in ('student_view_by_id', 'course_view_by_id'):
+            results[f'week7.route.{rule.endpoint}.uncached'] = timed(
+                get(client, path), repeat, setup=app.details_cache.clear)
+
+    # the query-string variants of the detail pages and the API formats
+    results['week7.route.student_view?s'] = timed(get(client, f'/student?s={sid}'), repeat)
+    results['week7.route.course_view?c'] = timed(get(client, f'/course?c={cid}'), repeat)
+    results['week7.route.api_enrollments.ndjson'] = timed(get(client, '/api/v1/enrollments?format=ndjson'), repeat)
+    # a broad typeahead prefix (capped, unranked) and a narrow one (ranked)
+    results['week7.route.search_view?q=broad'] = timed(get(client, '/search?q=s&format=json'), repeat)
+    results['week7.route.search_view?q=narrow'] = timed(get(client, '/search?q=S000001&format=json'), repeat)
+    # enrollment form typeahead, from the options cache and from the database
+    for kind, q in (('students', 'S00001'), ('courses', 'C00')):
+        path = f'/api/v1/options/{kind}?q={q}'
+        results[f'week7.route.api_options.{kind}'] = timed(get(client, path), repeat)
+        results[f'week7.route.api_options.{kind}.uncached'] = timed(get(client, path), repeat, setup=app.options_cache.clear)
+
+    # writes, each on fresh keys so they keep succeeding
+    counter = iter(range(10 ** 9))
+
+    def create_student():
+        n = next(counter)
+        r = client.post('/student/create', data={'roll': f'B{n:09d}', 'f_name': 'Bench', 'l_name': 'Mark'})
+        if r.status_code != 302:
+            raise RuntimeError(f'/student/create -> {r.status_code}')
+
+    results['week7.write.create_student'] = timed(create_student, repeat)
+    return results
+
+
+BENCHMARKS = {'week3': week3, 'week4': week4, 'week7': week7}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the micro-benchmarks of one week in this process.')
+    parser.add_argument('week', choices=sorted(BENCHMARKS))
+    parser.add_argument('data_dir')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    work = tempfile.mkdtemp(prefix=f'bench_{args.week}_')
+    try:
+        # the apps print progress; keep stdout for the JSON result
+        real_stdout = sys.stdout
+        sys.stdout = sys.stderr
+        try:
+            results = BENCHMARKS[args.week](data_dir, work, args.repeat)
+        finally:
+            sys.stdout = real_stdout
+        json.dump(results, sys.stdout)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
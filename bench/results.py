@@ -0,0 +1,58 @@
+"""Saving benchmark results per commit and comparing two runs."""
+import os
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+from bench import ROOT, RESULTS_DIR
+
+# the metric compared per benchmark and whether bigger is better
+METRICS = {'median_ms': False, 'rps': True, 'p99_ms': False, 'bytes': False}
+
+
+def git_commit():
+    """Short hash of HEAD, with '-dirty' when the tree has uncommitted changes."""
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    if git('status', '--porcelain', '--untracked-files=no'):
+        commit += '-dirty'
+    return commit
+
+
+def save(results, params, path=None):
+    commit = git_commit()
+    doc = {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f'{commit}.json')
+    with open(path, 'w') as f:
+        json.dump(doc, f, indent=1, sort_keys=True)
+    return path
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold=10.0):
+    """[(name, metric, old, new, change %, regressed)] for the benchmarks in both runs."""
+    rows = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        a, b = old['results'][name], new['results'][name]
+        for metric, higher_is_better in METRICS.items():
+            if metric not in a or metric not in b or not a[metric]:
+                continue
+            change = (b[metric] - a[metric]) / a[metric] * 100
+            worse = -change if higher_is_better else change
+            rows.append((name, metric, a[metric], b[metric], change, worse > threshold))
+    return rows
@@ -0,0 +1,52 @@
+"""Serve one week's app on a scratch copy of the synthetic data, for the HTTP load mode.
+
+    python -m bench.serve week7 DATA_DIR PORT
+
+Uses Werkzeug's threaded server; point bench.load (or Week 7/loadtest.py) at a
+production server instead to measure that.
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+
+from werkzeug.serving import make_server
+
+from bench import WEEKS
+
+SERVED = ('week4', 'week7')
+
+
+def prepare(week, data_dir, work):
+    """Copy the data the week's app needs into work and point the app at it."""
+    if week == 'week4':
+        shutil.copy(os.path.join(data_dir, 'data.csv'), work)
+        os.environ['WEEK4_DATA_FILE'] = os.path.join(work, 'data.csv')
+        os.environ['WEEK4_CHARTS_DIR'] = os.path.join(work, 'charts')
+    elif week == 'week7':
+        shutil.copy(os.path.join(data_dir, 'week7.sqlite3'), work)
+        os.environ['WEEK7_DB_PATH'] = os.path.join(work, 'week7.sqlite3')
+    else:
+        raise ValueError(f'{week} has no web app, expected one of {SERVED}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a week's app on synthetic data.")
+    parser.add_argument('week', choices=SERVED)
+    parser.add_argument('data_dir')
+    parser.add_argument('port', type=int)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix=f'bench_serve_{args.week}_')
+    try:
+        prepare(args.week, os.path.abspath(args.data_dir), work)
+        sys.path.insert(0, WEEKS[args.week])
+        from app import app
+        make_server('127.0.0.1', args.port, app, threaded=True).serve_forever()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
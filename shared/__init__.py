@@ -0,0 +1,6 @@
+"""Code shared by the week apps.
+
+Each week folder that uses it has a ``shared`` symlink to this directory, so
+``from shared import metrics`` works from any module there, and one copy serves
+every week.
+"""
@@ -0,0 +1,244 @@
+"""Opt-in request metrics and profiling.
+
+Nothing is recorded unless ``init_app`` is called with ``app.config["METRICS"]``
+set (each week's app.py sets it from ``WEEK4_METRICS=1`` / ``WEEK7_METRICS=1``). Then:
+
+- the latency of every request is recorded per route in a log-linear
+  (HDR-style) histogram with about 1.5% relative error;
+- SQL statements are counted and timed per request when ``init_app`` is given
+  an SQLAlchemy engine (``before_cursor_execute`` / ``after_cursor_execute``);
+- template render time is taken from Flask's template signals, and any other
+  step can be timed with ``with metrics.timer("chart"): ...``;
+- ``/metrics`` returns all of it in the Prometheus text format;
+- ``?profile=1`` runs that request under cProfile and writes a ``.prof`` file
+  (read it with ``python -m pstats``) into ``app.config["PROFILE_DIR"]``; the
+  file name is returned in the ``X-Profile`` header. Streamed bodies are
+  produced after the profile ends, so they are not included. Since any client
+  could fill the disk with profiles, this only works in debug mode or with
+  ``app.config["METRICS_PROFILE"]`` set; otherwise the parameter is ignored.
+"""
+import os
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+from flask import g, request, current_app, Response, has_request_context, before_render_template, template_rendered
+
+SUB_BUCKETS = 64  # per power of two; sets the relative error of the histograms
+# bucket bounds (seconds) of the Prometheus histograms, derived from the HDR counts
+EXPORT_BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """Counts of microsecond values in log-linear buckets (exact below 2 * SUB_BUCKETS us)."""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+
+    @staticmethod
+    def bucket(us):
+        if us < 2 * SUB_BUCKETS:
+            return us
+        shift = us.bit_length() - SUB_BUCKETS.bit_length()
+        return (shift + 1) * SUB_BUCKETS + (us >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def upper(bucket):
+        """Largest microsecond value that falls into bucket."""
+        if bucket < 2 * SUB_BUCKETS:
+            return bucket
+        shift = bucket // SUB_BUCKETS - 1
+        return ((bucket % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, seconds):
+        b = self.bucket(max(0, int(seconds * 1e6)))
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank:
+                return self.upper(b) / 1e6
+        return self.upper(max(self.counts)) / 1e6
+
+    def cumulative(self, bounds):
+        """Number of values <= each bound (seconds)."""
+        out = []
+        for bound in bounds:
+            limit = bound * 1e6
+            out.append(sum(n for b, n in self.counts.items() if self.upper(b) <= limit))
+        return out
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + '}'
+
+
+class Registry:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms = {}  # name -> {label tuple: Histogram}
+        self.counters = {}  # name -> {label tuple: value}
+        self.help = {}
+
+    def observe(self, name, seconds, help='', **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            series.setdefault(key, Histogram()).record(seconds)
+            self.help.setdefault(name, help)
+
+    def inc(self, name, value=1, help='', **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            self.help.setdefault(name, help)
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                full = f'{self.prefix}_{name}'
+                lines += [f'# HELP {full} {self.help[name]}', f'# TYPE {full} counter']
+                for key, value in sorted(series.items()):
+                    lines.append(f'{full}{_labels(dict(key))} {value}')
+            for name, series in sorted(self.histograms.items()):
+                full = f'{self.prefix}_{name}_seconds'
+                lines += [f'# HELP {full} {self.help[name]}', f'# TYPE {full} histogram']
+                for key, h in sorted(series.items()):
+                    labels = dict(key)
+                    for bound, n in zip(EXPORT_BOUNDS, h.cumulative(EXPORT_BOUNDS)):
+                        lines.append(f'{full}_bucket{_labels({**labels, "le": bound})} {n}')
+                    lines.append(f'{full}_bucket{_labels({**labels, "le": "+Inf"})} {h.count}')
+                    lines.append(f'{full}_sum{_labels(labels)} {h.sum:.6f}')
+                    lines.append(f'{full}_count{_labels(labels)} {h.count}')
+                # the HDR quantiles, which the fixed export buckets cannot give precisely
+                quantiles = f'{self.prefix}_{name}_quantile_seconds'
+                lines += [f'# HELP {quantiles} {self.help[name]} (quantiles)', f'# TYPE {quantiles} gauge']
+                for key, h in sorted(series.items()):
+                    for q in QUANTILES:
+                        lines.append(f'{quantiles}{_labels({**dict(key), "quantile": q})} {h.quantile(q):.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = None  # set by init_app when metrics are enabled
+_track_sql = False
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def observe(name, seconds, **labels):
+    """Record a duration measured elsewhere (e.g. in a worker process) into the <name> histogram."""
+    if registry is not None:
+        registry.observe(name, seconds, help=f'Time spent in {name}', **labels)
+
+
+@contextmanager
+def timer(name, **labels):
+    """Time the block into the <name> histogram (no-op while metrics are off)."""
+    if registry is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - started, help=f'Time spent in {name}', **labels)
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    if _track_sql:
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+    if request.args.get('profile') == '1' and (current_app.debug or current_app.config.get('METRICS_PROFILE')):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _after_request(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        directory = current_app.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        name = f"{request.endpoint or 'unmatched'}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{id(profiler):x}.prof"
+        profiler.dump_stats(os.path.join(directory, name))
+        response.headers['X-Profile'] = name
+    started = g.get('metrics_started')
+    if started is not None:
+        route = _route()
+        registry.observe('request_duration', time.perf_counter() - started, help='Request latency', route=route)
+        registry.inc('requests_total', help='Requests served', route=route, method=request.method,
+                     status=response.status_code)
+        if 'sql_count' in g:
+            registry.inc('sql_queries_total', g.sql_count, help='SQL statements executed', route=route)
+            registry.inc('sql_seconds_total', round(g.sql_seconds, 6), help='Time spent in SQL statements', route=route)
+            registry.observe('request_sql', g.sql_seconds, help='SQL time per request', route=route)
+    return response
+
+
+# The start time lives on the statement's execution context, so a statement that raises (and
+# never reaches after_cursor_execute) leaves nothing behind for the next one to pick up.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is not None and has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += time.perf_counter() - started
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('template_started', []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    started = g.template_started.pop()
+    registry.observe('template_render', time.perf_counter() - started, help='Template render time',
+                     template=template.name)
+
+
+def init_app(app, prefix, engine=None):
+    """Install the hooks and /metrics if app.config["METRICS"] is set; engine adds SQL timing."""
+    global registry, _track_sql
+    if not app.config.get('METRICS'):
+        return
+    registry = Registry(prefix)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.root_path, 'profiles'))
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    if engine is not None:
+        _track_sql = True
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')